@@ -1,14 +1,50 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+import argparse
+import glob
+import hashlib
+import logging
+import logging.handlers
+import multiprocessing
+import queue
 import pandas as pd
 import json
 import re
-from datetime import datetime
+import sqlite3
+from datetime import date, datetime
 import os
 import threading
-from statistics import mode, StatisticsError
 import numpy as np
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from perf_metrics import RunMetrics  # 同目录下的共享性能统计模块 / shared instrumentation module next to this script
+
+# tkinter 只在创建窗口时导入，--headless 批量模式启动时完全不导入 / tkinter is imported only when the window is built, never in --headless mode
+tk = ttk = filedialog = messagebox = None
+
+
+def _import_tkinter():
+    global tk, ttk, filedialog, messagebox
+    if tk is None:
+        import tkinter as tk
+        from tkinter import filedialog, messagebox, ttk
+
+
+LOGGER = logging.getLogger("ExcelJSONProcessor")
+
+# 界面日志队列与刷新参数 / Tk log sink settings
+LOG_QUEUE_SIZE = 10000
+LOG_DRAIN_INTERVAL_MS = 100
+LOG_MAX_LINES = 5000
+
+try:
+    import orjson  # 可选依赖：显式开启 fast_json 时用于加速JSON读写 / optional, used only when fast_json is requested
+except ImportError:
+    orjson = None
+
+try:
+    import python_calamine  # 可选依赖：安装后使用 calamine 引擎读取Excel / optional, Rust-based xlsx reader
+    EXCEL_READ_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_READ_ENGINE = 'openpyxl'
 
 # Custom JSON encoder to handle NumPy types
 class NumpyEncoder(json.JSONEncoder):
@@ -25,8 +61,595 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.tolist()
         return super().default(obj)
 
-class ExcelJSONProcessor:
+class BillNumberIndex:
+    """
+    Persistent sqlite index of bill numbers that already received a warning letter.
+    Lets the dedup step reach across runs and months instead of relying only on the
+    'auxiliary' sheet of the current workbook. A workbook reserves the bill numbers it
+    keeps in one write transaction, so parallel workers never issue the same bill twice,
+    and releases them again if its output file is not saved.
+    """
+    def __init__(self, path, wait_for=None, done=None, source=None):
+        self.path = path
+        self.source = source
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS issued_bills (bill_num TEXT PRIMARY KEY, source TEXT, added_at TEXT) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        # 批量模式下各工作簿按输入顺序轮流预留：等待前一个工作簿预留完成，结果与并行进程数无关
+        self.wait_for = wait_for
+        self.done = done
+        self.reserved = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.finish_turn()
+        self.conn.close()
+
+    def finish_turn(self):
+        if self.done is not None:
+            self.done.set()
+
+    @staticmethod
+    def source_key(input_file):
+        """Identify a workbook by absolute path and content, so a same-named file from another folder or month is a new source."""
+        digest = hashlib.sha1()
+        with open(input_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return f"{os.path.abspath(input_file)}|{digest.hexdigest()}"
+
+    @staticmethod
+    def normalize(values):
+        # 统一为去空格的大写字符串；整数值浮点数（如 Excel 中的纯数字单号）去掉 ".0"
+        values = values.dropna()
+        return values.map(lambda v: str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)).str.strip().str.upper()
+
+    def reserve(self, values, source=None, issued=None):
+        """
+        Record `issued` (e.g. the auxiliary sheet) as already sent, then reserve `values` for `source`
+        (default: the index's own source). Returns a boolean mask of the values already issued under
+        another source; entries recorded under `source` itself are ignored so reruns stay idempotent.
+        """
+        source = source if source is not None else self.source
+        if self.wait_for is not None:
+            self.wait_for.wait()
+        try:
+            normalized = self.normalize(values)
+            added_at = datetime.now().isoformat(timespec='seconds')
+            cursor = self.conn.cursor()
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (bill_num TEXT PRIMARY KEY) WITHOUT ROWID")
+            self.conn.commit()
+            # 查询与写入在同一个写事务中完成，其他进程在此期间无法预留相同单号
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if issued is not None:
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO issued_bills VALUES (?, NULL, ?)",
+                        ((bill_num, added_at) for bill_num in self.normalize(issued).unique())
+                    )
+                cursor.execute("DELETE FROM lookup")
+                cursor.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((bill_num,) for bill_num in normalized.unique()))
+                found = {row[0] for row in cursor.execute(
+                    "SELECT lookup.bill_num FROM lookup JOIN issued_bills ON issued_bills.bill_num = lookup.bill_num "
+                    "WHERE issued_bills.source IS NULL OR issued_bills.source != ?", (source or "",)
+                )}
+                new_bills = [row[0] for row in cursor.execute(
+                    "SELECT bill_num FROM lookup WHERE bill_num NOT IN (SELECT bill_num FROM issued_bills)"
+                )]
+                cursor.executemany("INSERT INTO issued_bills VALUES (?, ?, ?)", ((bill_num, source, added_at) for bill_num in new_bills))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.reserved.extend(new_bills)
+            return normalized.isin(found).reindex(values.index, fill_value=False)
+        finally:
+            self.finish_turn()
+
+    def release(self):
+        """Drop the reservations made through this index, e.g. when the output file could not be saved."""
+        with self.conn:
+            self.conn.executemany("DELETE FROM issued_bills WHERE bill_num = ?", ((bill_num,) for bill_num in self.reserved))
+        self.reserved = []
+
+
+class ExcelJSONPipeline:
+    """
+    Headless conversion pipeline shared by the Tk window and the command-line batch mode.
+    """
+    def __init__(self, log_prefix="", bill_index_path=None, sidecar_format=None, fast_json=False, dedup_after=None, dedup_done=None):
+        self.log_prefix = log_prefix
+        self.bill_index_path = bill_index_path
+        self.dedup_after = dedup_after
+        self.dedup_done = dedup_done
+        self.sidecar_format = sidecar_format
+        # orjson 输出为紧凑格式且把 NaN/Infinity 写成 null，与标准库结果不同，只在显式开启时使用
+        self.fast_json = fast_json and orjson is not None
+        self.metrics = RunMetrics("json_converter", profile=False, trace_memory=False)
+
+    def add_log(self, message):
+        LOGGER.info(f"{self.log_prefix}{message}")
+
+    def set_status(self, message):
+        pass
+
+    def normalize_date(self, date_value):
+        if pd.isna(date_value): return None
+        if isinstance(date_value, (pd.Timestamp, datetime)):
+            return date_value.strftime('%Y-%m-%d')
+        try:
+            return pd.to_datetime(date_value).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            return None
+
+    def extract_date_from_filename(self, filename):
+        patterns = [r'(\d{1,2})月(\d{1,2})日', r'(\d{1,2})-(\d{1,2})', r'(\d{4})(\d{2})(\d{2})', r'(\d{2})(\d{2})']
+        for pattern in patterns:
+            match = re.search(pattern, filename)
+            if match:
+                groups = match.groups()
+                if len(groups) == 3: # YYYYMMDD
+                    return f"{int(groups[1]):02d}{int(groups[2]):02d}"
+                if len(groups) == 2: # MMDD
+                    return f"{int(groups[0]):02d}{int(groups[1]):02d}"
+        return datetime.now().strftime("%m%d")
+
+    def standardize_violation_type(self, value):
+        if pd.isna(value):
+            return value
+        
+        value_str = str(value).lower()
+        
+        if any(keyword in value_str for keyword in ['严厉', '严重', 'stern', 'severe']):
+            return "严厉Stern"
+        elif any(keyword in value_str for keyword in ['口述', '口头', 'verbal', 'oral']):
+            return "口述Verbal"
+        else:
+            return value
+
+    def determine_violation_type(self, series):
+        # 基于预处理后的标准化值进行识别
+        series_str = series.astype(str)
+        if (series_str == "口述Verbal").all():
+            return "口述Verbal"
+        if (series_str == "严厉Stern").all():
+            return "严厉Stern"
+        return series.iloc[0]
+
+    def determine_upgraded_violation_type(self, series):
+        # 基于预处理后的标准化值进行识别和升级处理
+        series_str = series.astype(str)
+        if (series_str == "口述Verbal").all():
+            return "严厉Stern"  # "升级处罚"规则
+        if (series_str == "严厉Stern").all():
+            return "严厉Stern"
+        return series.iloc[0]
+
+    def exact_merge(self, details_df):
+        """
+        Merge records sharing the same Employee ID, Violation date and Violation type
+        with grouped aggregations instead of building one row per group in Python.
+        Returns (merged rows in group-key order, untouched rows, number of rows merged).
+        """
+        keys = ['Employee ID', 'Violation date', 'Violation type']
+
+        # 与 groupby 默认行为一致：键中含空值的记录不参与合并
+        exact_mask = details_df[keys].notna().all(axis=1) & details_df.duplicated(subset=keys, keep=False)
+        unmerged_after_exact = details_df[~exact_mask]
+        to_merge = details_df[exact_mask]
+        if to_merge.empty:
+            return pd.DataFrame(), unmerged_after_exact, 0
+
+        grouped = to_merge.groupby(keys, sort=True)
+        bill_nums = to_merge['false_bill_num'].astype(str).groupby([to_merge[k] for k in keys], sort=True).agg(",".join)
+
+        # 其余字段取每组第一条记录；Violation type 为分组键，组内取值一致，
+        # determine_violation_type 的结果即为该键值本身
+        exact_merge_results = to_merge.drop_duplicates(subset=keys).set_index(keys).reindex(bill_nums.index)
+        exact_merge_results['false_bill_num'] = bill_nums
+        exact_merge_results['false_num'] = grouped['false_num'].sum()
+        exact_merge_results = exact_merge_results.reset_index()[details_df.columns]
+
+        return exact_merge_results, unmerged_after_exact, len(to_merge)
+
+    def partial_merge(self, unmerged_after_exact, month_day_from_filename):
+        """
+        Merge every (Employee ID, Violation type) group with at least 3 records in one
+        batched pass: bill(date) labels are built column-wise, the year mode comes from a
+        grouped value count and the merged date uses the MMDD parsed from the filename.
+        Returns (merged rows in group-key order, untouched rows, number of rows merged).
+        """
+        keys = ['Employee ID', 'Violation type']
+
+        # ngroup 按分组键排序编号，键中含空值的记录编号为 -1
+        group_ids = unmerged_after_exact.groupby(keys, sort=True).ngroup()
+        group_sizes = group_ids.map(group_ids.value_counts())
+        partial_mask = (group_ids >= 0) & (group_sizes >= 3)
+        unmerged_final = unmerged_after_exact[~partial_mask]
+        to_merge = unmerged_after_exact[partial_mask]
+        if to_merge.empty:
+            return pd.DataFrame(), unmerged_final, 0
+        group_ids = group_ids[partial_mask]
+
+        # 创建包含单号和日期的标签，用于拼接
+        bill_strs = to_merge['false_bill_num'].astype(str)
+        date_strs = pd.to_datetime(to_merge['Violation date'], errors='coerce').dt.strftime('%Y-%m-%d')
+        bill_labels = bill_strs.where(to_merge['Violation date'].isna(), bill_strs + "(" + date_strs + ")")
+
+        # 年份众数：出现次数最多者优先，次数相同时取组内最先出现的年份（与 statistics.mode 一致）
+        years = pd.DataFrame({
+            'group_id': group_ids,
+            'year': pd.to_datetime(to_merge['Violation date'], errors='coerce').dt.year,
+            'position': np.arange(len(to_merge)),
+        }).dropna(subset=['year'])
+        year_counts = years.groupby(['group_id', 'year']).agg(count=('position', 'size'), first_seen=('position', 'min')).reset_index()
+        year_modes = (year_counts.sort_values(['group_id', 'count', 'first_seen'], ascending=[True, False, True])
+                      .drop_duplicates('group_id').set_index('group_id')['year'].astype(int))
+
+        partial_merge_results = to_merge.assign(_group_id=group_ids).drop_duplicates('_group_id').set_index('_group_id').sort_index()
+        group_index = partial_merge_results.index
+        sizes = group_ids.value_counts().reindex(group_index)
+        for emp_id, size in zip(partial_merge_results['Employee ID'], sizes):
+            self.add_log(f"部分合并: 正在处理 Employee ID {emp_id} 的 {size} 条记录 / Partial Merge: Processing {size} records for Employee ID {emp_id}.")
+
+        partial_merge_results['false_bill_num'] = bill_labels.groupby(group_ids).agg(",".join)
+        partial_merge_results['false_num'] = to_merge['false_num'].groupby(group_ids).sum()
+        # 组内 Violation type 取值一致，"升级处罚"规则即口述升级为严厉
+        partial_merge_results['Violation type'] = partial_merge_results['Violation type'].replace("口述Verbal", "严厉Stern")
+
+        # 每个年份只解析一次目标日期，无有效日期的分组使用当前年份
+        group_years = year_modes.reindex(group_index).fillna(datetime.now().year).astype(int)
+        merged_dates = {
+            year: pd.to_datetime(f"{year}-{month_day_from_filename[:2]}-{month_day_from_filename[2:]}").date()
+            for year in group_years.unique()
+        }
+        partial_merge_results['Violation date'] = group_years.map(merged_dates)
+
+        return partial_merge_results.reset_index(drop=True), unmerged_final, len(to_merge)
+
+    def preprocess_data(self, details_df, auxiliary_df, filename, bill_index=None):
+        self.add_log("开始数据预处理 / Starting data preprocessing...")
+        
+        # 0. 初始清理
+        details_df['Violation date'] = pd.to_datetime(details_df['Violation date'], errors='coerce').dt.date
+
+        # 1. 跨Sheet去重
+        if not auxiliary_df.empty and 'false_bill_num' in auxiliary_df.columns and 'false_bill_num' in details_df.columns:
+            initial_count = len(details_df)
+            duplicates = details_df['false_bill_num'].isin(auxiliary_df['false_bill_num'])
+            details_df = details_df[~duplicates].copy()
+            self.metrics.count("removed by auxiliary dedup", initial_count - len(details_df))
+            self.add_log(f"步骤1 (跨表去重): 移除了 {initial_count - len(details_df)} 条记录 / Step 1 (Cross-sheet dedup): Removed {initial_count - len(details_df)} records.")
+
+        # 1b. 历史单号索引去重：auxiliary 中的单号并入索引，本次保留的单号立即预留，文件未保存时再释放
+        if bill_index is not None and 'false_bill_num' in details_df.columns:
+            issued = auxiliary_df['false_bill_num'] if not auxiliary_df.empty and 'false_bill_num' in auxiliary_df.columns else None
+            initial_count = len(details_df)
+            duplicates = bill_index.reserve(details_df['false_bill_num'], issued=issued)
+            details_df = details_df[~duplicates].copy()
+            self.metrics.count("removed by bill index dedup", initial_count - len(details_df))
+            self.add_log(f"步骤1 (历史索引去重): 移除了 {initial_count - len(details_df)} 条记录 / Step 1 (History index dedup): Removed {initial_count - len(details_df)} records.")
+
+        # 2. Violation type统一化
+        details_df['Violation type'] = details_df['Violation type'].apply(self.standardize_violation_type)
+        self.add_log("步骤2: Violation type 值已标准化 / Step 2: Violation type values standardized.")
+
+        # 3. 执行完全合并
+        self.add_log("步骤3: 执行完全合并 / Step 3: Performing Exact Merge...")
+        with self.metrics.stage("exact merge"):
+            exact_merge_results, unmerged_after_exact, exact_merged_count = self.exact_merge(details_df)
+        self.metrics.count("exact merged rows", exact_merged_count)
+
+        self.add_log(f"完全合并: 合并了 {exact_merged_count} 条记录为 {len(exact_merge_results)} 条，剩余 {len(unmerged_after_exact)} 条未合并记录 / Exact Merge: Merged {exact_merged_count} records into {len(exact_merge_results)} records, {len(unmerged_after_exact)} records remain unmerged.")
+
+        # 4. 执行部分合并（只对未参与完全合并的记录进行处理）
+        self.add_log("步骤4: 执行部分合并 / Step 4: Performing Partial Merge...")
+        month_day_from_filename = self.extract_date_from_filename(filename)
+        with self.metrics.stage("partial merge"):
+            partial_merge_results, unmerged_final, partial_merged_count = self.partial_merge(unmerged_after_exact, month_day_from_filename)
+        self.metrics.count("partial merged rows", partial_merged_count)
+        
+        self.add_log(f"部分合并: 合并了 {partial_merged_count} 条记录为 {len(partial_merge_results)} 条，最终剩余 {len(unmerged_final)} 条未合并记录 / Partial Merge: Merged {partial_merged_count} records into {len(partial_merge_results)} records, {len(unmerged_final)} records remain unmerged.")
+
+        # 合并最终结果
+        final_parts = []
+        if not exact_merge_results.empty:
+            final_parts.append(exact_merge_results)
+        if not partial_merge_results.empty:
+            final_parts.append(partial_merge_results)
+        if not unmerged_final.empty:
+            final_parts.append(unmerged_final)
+        
+        final_df = pd.concat(final_parts, ignore_index=True) if final_parts else details_df.iloc[:0].reset_index(drop=True)
+        self.add_log(f"数据预处理完成，最终剩余 {len(final_df)} 条记录 / Preprocessing finished, {len(final_df)} records remaining.")
+        return final_df
+
+    def create_json_column(self, df):
+        self.add_log("正在创建JSON列 / Creating JSON column...")
+        cols_to_json = [col for col in df.columns if col not in ['Employee ID', 'Violation date', 'Violation type', 'Violation details']]
+        df['Violation details'] = self.serialize_json_payloads(df, cols_to_json)
+        return df[['Employee ID', 'Violation date', 'Violation type', 'Violation details']]
+
+    def serialize_json_payloads(self, df, cols_to_json):
+        """
+        Serialize the payload columns into one JSON string per row, column by column.
+        Each column is converted to native Python values once and nulls are skipped via a
+        precomputed mask, so NumpyEncoder.default is never hit for ordinary cells.
+        The stdlib encoder is the default; orjson is used only when fast_json is set,
+        and its output is compact ({"a":1}) with non-finite floats written as null.
+        """
+        if self.fast_json:
+            options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            dumps = lambda data: orjson.dumps(data, option=options).decode('utf-8')
+        else:
+            dumps = NumpyEncoder(ensure_ascii=False).encode
+
+        # 数值列经 tolist() 直接转为原生类型；object 列中残留的 NumPy 标量逐个转换
+        column_values = []
+        for col in cols_to_json:
+            values = df[col].tolist()
+            if df[col].dtype == object:
+                values = [v.item() if isinstance(v, np.generic) else v for v in values]
+            column_values.append(values)
+        column_masks = [mask.tolist() for _, mask in df[cols_to_json].notna().items()]
+
+        payloads = []
+        for row_values, row_mask in zip(zip(*column_values), zip(*column_masks)):
+            data = {col: value for col, value, keep in zip(cols_to_json, row_values, row_mask) if keep}
+            payloads.append(dumps(data) if data else None)
+
+        if not cols_to_json:
+            payloads = [None] * len(df)
+        return pd.Series(payloads, index=df.index, dtype=object)
+
+    def parse_json_details(self, df):
+        """
+        Parse JSON values in 'Violation details' column and create separate columns
+        for false_type, false_num, and false_bill_num
+        """
+        self.add_log("正在解析JSON详情字段 / Parsing JSON details field...")
+        
+        # Decode the whole column in one pass; failures are collected into a single report
+        loads = orjson.loads if self.fast_json else json.loads
+        parsed_details, parse_failures = [], []
+        for idx, value in zip(df.index, df['Violation details'].tolist()):
+            json_data = {}
+            if pd.notna(value):
+                try:
+                    json_data = loads(value)
+                    if not isinstance(json_data, dict):
+                        raise TypeError(f"expected a JSON object, got {type(json_data).__name__}")
+                except (json.JSONDecodeError, TypeError) as e:
+                    parse_failures.append((idx, e))
+                    json_data = {}
+            parsed_details.append(json_data)
+
+        for field in ['false_type', 'false_num', 'false_bill_num']:
+            df[field] = pd.Series([json_data.get(field) for json_data in parsed_details], index=df.index, dtype=object)
+
+        if parse_failures:
+            failed_rows = ", ".join(str(idx) for idx, _ in parse_failures[:10])
+            if len(parse_failures) > 10:
+                failed_rows += ", ..."
+            self.add_log(f"警告: {len(parse_failures)} 行JSON解析失败 (行: {failed_rows}) / Warning: Failed to parse JSON in {len(parse_failures)} rows (rows: {failed_rows}). 首个错误 / First error: {parse_failures[0][1]}")
+        
+        # Remove the original Violation details column
+        df = df.drop('Violation details', axis=1)
+        
+        # Reorder columns to put the new fields after the main fields
+        cols = ['Employee ID', 'Violation date', 'Violation type', 'false_type', 'false_num', 'false_bill_num']
+        df = df[cols]
+        
+        self.add_log("JSON详情解析完成 / JSON details parsing completed.")
+        return df
+
+    def build_original_type_df(self, payload_df):
+        """
+        Build the hidden 'details_original_type' sheet straight from the pre-serialization
+        columns, so the Violation details JSON never has to be parsed back.
+        """
+        cols = ['Employee ID', 'Violation date', 'Violation type']
+        original_type_df = payload_df[cols].copy()
+        for field in ['false_type', 'false_num', 'false_bill_num']:
+            if field in payload_df.columns:
+                original_type_df[field] = payload_df[field].astype(object).where(payload_df[field].notna(), None)
+            else:
+                original_type_df[field] = None
+        return original_type_df
+
+    def correct_data(self, df, violation_type_int, payload_df):
+        self.add_log("正在进行最终数据纠正 / Performing final data correction...")
+        
+        # Create original_type_df from the pre-serialization payload columns
+        original_type_df = self.build_original_type_df(payload_df)
+        
+        # Process main df
+        df['Violation date'] = df['Violation date'].apply(self.normalize_date)
+        df['Violation type'] = violation_type_int
+        self.add_log(f"Violation type 已统一为 {violation_type_int} / Violation type standardized to {violation_type_int}.")
+        
+        return df, original_type_df
+
+    def read_workbook_sheets(self, input_file, sheet_columns):
+        """
+        Read several sheets of one workbook, keeping only the requested columns.
+        sheet_columns maps sheet name -> list of column names (None keeps every column);
+        sheets missing from the workbook come back as None.
+        Uses the calamine engine when installed, otherwise pandas' openpyxl reader.
+        """
+        with pd.ExcelFile(input_file, engine=EXCEL_READ_ENGINE) as xls:
+            return {
+                sheet_name: pd.read_excel(xls, sheet_name=sheet_name, usecols=None if columns is None else (lambda col, columns=columns: col in columns))
+                if sheet_name in xls.sheet_names else None
+                for sheet_name, columns in sheet_columns.items()
+            }
+
+    def write_output_workbook(self, output_path, sheets):
+        """
+        Write (sheet_name, df, hidden) sheets with xlsxwriter in constant_memory mode.
+        Rows are written one at a time from pre-converted native values, so only the
+        current row is held in memory; cell output matches DataFrame.to_excel.
+        """
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+        try:
+            # 表头样式与 pandas to_excel 一致
+            header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+            date_format = workbook.add_format({'num_format': 'YYYY-MM-DD'})
+
+            for sheet_name, df, hidden in sheets:
+                worksheet = workbook.add_worksheet(sheet_name)
+                for col_idx, col in enumerate(df.columns):
+                    worksheet.write(0, col_idx, col, header_format)
+
+                columns = [self._native_cell_values(df[col]) for col in df.columns]
+                date_columns = [any(isinstance(value, (datetime, date)) for value in values) for values in columns]
+                for row_idx, row in enumerate(zip(*columns), start=1):
+                    for col_idx, value in enumerate(row):
+                        if value is None:
+                            continue
+                        if date_columns[col_idx] and isinstance(value, (datetime, date)):
+                            worksheet.write_datetime(row_idx, col_idx, value, date_format)
+                        else:
+                            worksheet.write(row_idx, col_idx, value)
+
+                if hidden:
+                    worksheet.hide()
+        finally:
+            workbook.close()
+
+    def _native_cell_values(self, series):
+        # 空值写为空白单元格，正负无穷与 to_excel 一样写为 "inf"/"-inf"
+        values = series.astype(object).where(series.notna(), None).tolist()
+        if series.dtype.kind == 'f' or series.dtype == object:
+            values = [("inf" if v > 0 else "-inf") if isinstance(v, float) and np.isinf(v) else v for v in values]
+        return values
+
+    def write_sidecar(self, df, output_path, sidecar_format):
+        """Write the details sheet next to the workbook as CSV or Parquet for downstream systems."""
+        base_path = os.path.splitext(output_path)[0]
+        if sidecar_format == 'csv':
+            sidecar_path = f"{base_path}.csv"
+            df.to_csv(sidecar_path, index=False, encoding='utf-8-sig')
+        elif sidecar_format == 'parquet':
+            sidecar_path = f"{base_path}.parquet"
+            # object 列可能混合类型，非空值统一转为字符串，避免 Arrow 类型推断失败
+            object_cols = [col for col in df.columns if df[col].dtype == object]
+            df.assign(**{col: df[col].where(df[col].isna(), df[col].astype(str)) for col in object_cols}).to_parquet(sidecar_path, index=False)
+        else:
+            raise ValueError(f"不支持的附加输出格式 / Unsupported sidecar format: {sidecar_format}")
+        self.add_log(f"附加输出已保存 / Sidecar output saved to: {sidecar_path}")
+        return sidecar_path
+
+    def build_output_filename(self, input_file, prefix, suffix_type="auto", custom_suffix=""):
+        if suffix_type == "custom":
+            suffix = custom_suffix if custom_suffix else datetime.now().strftime("%m%d")
+        else:
+            suffix = self.extract_date_from_filename(os.path.basename(input_file))
+        return f"{prefix}-{suffix}.xlsx"
+
+    def process_workbook(self, input_file, output_dir, prefix, suffix_type, custom_suffix, violation_type_int):
+        """
+        Run the full read -> preprocess -> JSON -> correct -> write pipeline for one workbook
+        and return the output path.
+        """
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImportError("`xlsxwriter` module is not installed. Please install it with `pip install xlsxwriter`.")
+
+        self.set_status("正在读取文件 / Reading file...")
+        self.metrics = RunMetrics("json_converter", input_file=input_file, read_engine=EXCEL_READ_ENGINE, violation_type_int=violation_type_int,
+                                  json_library='orjson' if self.fast_json else 'json')
+        
+        # details 的其余列均写入JSON，需要全部读取；auxiliary 仅用于去重
+        with self.metrics.stage("read"):
+            sheets = self.read_workbook_sheets(input_file, {'details': None, 'auxiliary': ['false_bill_num']})
+        if sheets['details'] is None:
+            raise ValueError("Excel文件中必须包含'details'工作表 / Excel file must contain a 'details' sheet.")
+        
+        details_df = sheets['details']
+        auxiliary_df = sheets['auxiliary'] if sheets['auxiliary'] is not None else pd.DataFrame()
+        self.metrics.count("details rows", len(details_df))
+        self.metrics.count("auxiliary rows", len(auxiliary_df))
+        self.add_log(f"读取到 {len(details_df)} 条 'details' 记录和 {len(auxiliary_df)} 条 'auxiliary' 记录 / Read {len(details_df)} 'details' records and {len(auxiliary_df)} 'auxiliary' records.")
+
+        bill_index = None
+        if self.bill_index_path:
+            # 来源按绝对路径和文件内容区分：只有同一份文件重跑才不算重复，其他目录或月份的同名文件不行
+            bill_index = BillNumberIndex(self.bill_index_path, self.dedup_after, self.dedup_done, source=BillNumberIndex.source_key(input_file))
+        try:
+            # 预处理
+            with self.metrics.stage("preprocess"):
+                processed_df = self.preprocess_data(details_df, auxiliary_df, os.path.basename(input_file), bill_index)
+
+            # JSON转换
+            with self.metrics.stage("serialize"):
+                json_df = self.create_json_column(processed_df)
+
+            # 数据纠正
+            with self.metrics.stage("correct"):
+                final_df, original_type_df = self.correct_data(json_df, violation_type_int, processed_df)
+            self.metrics.count("output rows", len(final_df))
+
+            # 生成文件名并保存
+            self.set_status("正在生成并保存文件 / Generating and saving file...")
+            output_filename = self.build_output_filename(input_file, prefix, suffix_type, custom_suffix)
+            output_path = os.path.join(output_dir, output_filename)
+
+            with self.metrics.stage("write"):
+                self.write_output_workbook(output_path, [
+                    ('details', final_df, False),
+                    ('details_original_type', original_type_df, True),
+                ])
+            if self.sidecar_format:
+                with self.metrics.stage("write sidecar"):
+                    self.write_sidecar(final_df, output_path, self.sidecar_format)
+
+            if bill_index is not None:
+                self.add_log(f"历史单号索引已更新 / Bill number index updated: {self.bill_index_path}")
+        except Exception:
+            if bill_index is not None:
+                bill_index.release()
+                self.add_log("文件未保存，已释放本文件预留的单号 / Output not saved, released this workbook's bill number reservations.")
+            raise
+        finally:
+            if bill_index is not None:
+                bill_index.close()
+
+        # 每个输出文件旁边写一份本次运行的耗时与计数，便于对比规则调整前后的性能
+        stage_times = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds, calls in self.metrics.summary())
+        self.add_log(f"各环节耗时 / Stage timings: {stage_times}")
+        metrics_path = os.path.splitext(output_path)[0] + "_metrics.json"
+        # 输出文件已经写好，指标文件写入失败只记录警告
+        try:
+            self.metrics.write(metrics_path)
+        except Exception as e:
+            self.add_log(f"警告：运行指标未能保存 / Warning: Could not write the run metrics to {metrics_path}: {e}")
+        else:
+            self.add_log(f"运行指标已保存至 / Run metrics saved to: {metrics_path}")
+        self.add_log(f"处理完成！文件已保存至 / Processing complete! File saved to: {output_path}")
+        return output_path
+
+
+class ExcelJSONProcessor(ExcelJSONPipeline):
     def __init__(self):
+        _import_tkinter()
+        super().__init__()
+        # 工作线程只向有界队列写入日志，由 Tk 主循环定时批量刷新，处理过程从不等待界面
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.dropped_log_count = 0
+        self.pending_status = None
+        # 工作线程的处理结果也经队列交回 Tk 线程，由刷新定时器弹出对话框
+        self.process_results = queue.Queue()
         self.root = tk.Tk()
         self.root.title("虚假类警告信Json转换处理脚本")
         self.root.geometry("850x800")
@@ -44,6 +667,7 @@ class ExcelJSONProcessor:
         style.configure('Accent.TButton', font=('Microsoft YaHei UI', 10, 'bold'))
 
         self.setup_ui()
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
 
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="10")
@@ -134,9 +758,49 @@ class ExcelJSONProcessor:
 
     def add_log(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        try:
+            self.log_queue.put_nowait(f"[{timestamp}] {message}\n")
+        except queue.Full:
+            self.dropped_log_count += 1
+
+    def set_status(self, message):
+        # 状态栏只需最新值，由刷新定时器读取
+        self.pending_status = message
+
+    def drain_log_queue(self):
+        if self.pending_status is not None:
+            self.status_var.set(self.pending_status)
+            self.pending_status = None
+
+        lines = []
+        while True:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if self.dropped_log_count:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            lines.append(f"[{timestamp}] 日志队列已满，丢弃了 {self.dropped_log_count} 条日志 / Log queue full, dropped {self.dropped_log_count} log lines.\n")
+            self.dropped_log_count = 0
+
+        if lines:
+            self.log_text.insert(tk.END, "".join(lines))
+            # 控件仅保留最近 LOG_MAX_LINES 行
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete('1.0', f"{line_count - LOG_MAX_LINES + 1}.0")
+            self.log_text.see(tk.END)
+
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
+
+        # 日志先于结果入队，结束对话框显示时日志已全部刷新
+        while True:
+            try:
+                output_path, error = self.process_results.get_nowait()
+            except queue.Empty:
+                break
+            self.finish_processing(output_path, error)
 
     def select_file(self):
         file_path = filedialog.askopenfilename(title="选择Excel文件 / Select Excel File", filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")])
@@ -161,220 +825,6 @@ class ExcelJSONProcessor:
         self.status_var.set("就绪等待 / Ready")
         self.add_log("所有字段已清空 / All fields cleared.")
 
-    def normalize_date(self, date_value):
-        if pd.isna(date_value): return None
-        if isinstance(date_value, (pd.Timestamp, datetime)):
-            return date_value.strftime('%Y-%m-%d')
-        try:
-            return pd.to_datetime(date_value).strftime('%Y-%m-%d')
-        except (ValueError, TypeError):
-            return None
-
-    def extract_date_from_filename(self, filename):
-        patterns = [r'(\d{1,2})月(\d{1,2})日', r'(\d{1,2})-(\d{1,2})', r'(\d{4})(\d{2})(\d{2})', r'(\d{2})(\d{2})']
-        for pattern in patterns:
-            match = re.search(pattern, filename)
-            if match:
-                groups = match.groups()
-                if len(groups) == 3: # YYYYMMDD
-                    return f"{int(groups[1]):02d}{int(groups[2]):02d}"
-                if len(groups) == 2: # MMDD
-                    return f"{int(groups[0]):02d}{int(groups[1]):02d}"
-        return datetime.now().strftime("%m%d")
-
-    def standardize_violation_type(self, value):
-        if pd.isna(value):
-            return value
-        
-        value_str = str(value).lower()
-        
-        if any(keyword in value_str for keyword in ['严厉', '严重', 'stern', 'severe']):
-            return "严厉Stern"
-        elif any(keyword in value_str for keyword in ['口述', '口头', 'verbal', 'oral']):
-            return "口述Verbal"
-        else:
-            return value
-
-    def determine_violation_type(self, series):
-        # 基于预处理后的标准化值进行识别
-        series_str = series.astype(str)
-        if (series_str == "口述Verbal").all():
-            return "口述Verbal"
-        if (series_str == "严厉Stern").all():
-            return "严厉Stern"
-        return series.iloc[0]
-
-    def determine_upgraded_violation_type(self, series):
-        # 基于预处理后的标准化值进行识别和升级处理
-        series_str = series.astype(str)
-        if (series_str == "口述Verbal").all():
-            return "严厉Stern"  # "升级处罚"规则
-        if (series_str == "严厉Stern").all():
-            return "严厉Stern"
-        return series.iloc[0]
-
-    def preprocess_data(self, details_df, auxiliary_df, filename):
-        self.add_log("开始数据预处理 / Starting data preprocessing...")
-        
-        # 0. 初始清理
-        details_df['Violation date'] = pd.to_datetime(details_df['Violation date'], errors='coerce').dt.date
-
-        # 1. 跨Sheet去重
-        if not auxiliary_df.empty and 'false_bill_num' in auxiliary_df.columns and 'false_bill_num' in details_df.columns:
-            initial_count = len(details_df)
-            duplicates = details_df['false_bill_num'].isin(auxiliary_df['false_bill_num'])
-            details_df = details_df[~duplicates].copy()
-            self.add_log(f"步骤1 (跨表去重): 移除了 {initial_count - len(details_df)} 条记录 / Step 1 (Cross-sheet dedup): Removed {initial_count - len(details_df)} records.")
-
-        # 2. Violation type统一化
-        details_df['Violation type'] = details_df['Violation type'].apply(self.standardize_violation_type)
-        self.add_log("步骤2: Violation type 值已标准化 / Step 2: Violation type values standardized.")
-
-        # 3. 执行完全合并
-        self.add_log("步骤3: 执行完全合并 / Step 3: Performing Exact Merge...")
-        processed_dfs_pass1 = []
-        exact_merged_indices = []  # 记录参与完全合并的索引
-
-        groups_to_process_pass1 = details_df.groupby(['Employee ID', 'Violation date', 'Violation type'])
-        
-        for group_keys, group in groups_to_process_pass1:
-            if len(group) > 1:
-                # 记录参与完全合并的所有索引
-                exact_merged_indices.extend(group.index.tolist())
-                new_row = group.iloc[0].copy()
-                new_row['false_bill_num'] = ",".join(group['false_bill_num'].astype(str))
-                new_row['false_num'] = group['false_num'].sum()
-                new_row['Violation type'] = self.determine_violation_type(group['Violation type'])
-                processed_dfs_pass1.append(new_row.to_frame().T)
-        
-        # 获取未参与完全合并的记录
-        unmerged_after_exact = details_df.loc[~details_df.index.isin(exact_merged_indices)]
-        
-        # 完全合并后的结果
-        exact_merge_results = pd.concat(processed_dfs_pass1, ignore_index=True) if processed_dfs_pass1 else pd.DataFrame()
-        
-        self.add_log(f"完全合并: 合并了 {len(exact_merged_indices)} 条记录为 {len(exact_merge_results)} 条，剩余 {len(unmerged_after_exact)} 条未合并记录 / Exact Merge: Merged {len(exact_merged_indices)} records into {len(exact_merge_results)} records, {len(unmerged_after_exact)} records remain unmerged.")
-
-        # 4. 执行部分合并（只对未参与完全合并的记录进行处理）
-        self.add_log("步骤4: 执行部分合并 / Step 4: Performing Partial Merge...")
-        processed_dfs_pass2 = []
-        partial_merged_indices = []  # 记录参与部分合并的索引
-
-        groups_to_process_pass2 = unmerged_after_exact.groupby(['Employee ID', 'Violation type'])
-
-        for group_keys, group in groups_to_process_pass2:
-            if len(group) >= 3:
-                self.add_log(f"部分合并: 正在处理 Employee ID {group_keys[0]} 的 {len(group)} 条记录 / Partial Merge: Processing {len(group)} records for Employee ID {group_keys[0]}.")
-                # 记录参与部分合并的所有索引
-                partial_merged_indices.extend(group.index.tolist())
-
-                # --- 调整部分开始 ---
-                # 创建一个包含单号和日期的列表，用于拼接
-                false_bill_nums_with_date = [
-                    f"{row['false_bill_num']}({self.normalize_date(row['Violation date'])})"
-                    if pd.notna(row['Violation date']) else str(row['false_bill_num'])
-                    for _, row in group.iterrows()
-                ]
-
-                new_row = group.iloc[0].copy()
-                new_row['false_bill_num'] = ",".join(false_bill_nums_with_date)
-                # --- 调整部分结束 ---
-
-                new_row['false_num'] = group['false_num'].sum()
-                new_row['Violation type'] = self.determine_upgraded_violation_type(group['Violation type'])
-                
-                month_day_from_filename = self.extract_date_from_filename(filename)
-                valid_dates = group['Violation date'].dropna()
-                try:
-                    year_mode = mode(d.year for d in valid_dates)
-                except StatisticsError:
-                    year_mode = datetime.now().year
-                new_row['Violation date'] = pd.to_datetime(f"{year_mode}-{month_day_from_filename[:2]}-{month_day_from_filename[2:]}").date()
-                
-                processed_dfs_pass2.append(new_row.to_frame().T)
-
-        # 获取既未参与完全合并也未参与部分合并的记录
-        unmerged_final = unmerged_after_exact.loc[~unmerged_after_exact.index.isin(partial_merged_indices)]
-        
-        # 部分合并后的结果
-        partial_merge_results = pd.concat(processed_dfs_pass2, ignore_index=True) if processed_dfs_pass2 else pd.DataFrame()
-        
-        self.add_log(f"部分合并: 合并了 {len(partial_merged_indices)} 条记录为 {len(partial_merge_results)} 条，最终剩余 {len(unmerged_final)} 条未合并记录 / Partial Merge: Merged {len(partial_merged_indices)} records into {len(partial_merge_results)} records, {len(unmerged_final)} records remain unmerged.")
-
-        # 合并最终结果
-        final_parts = []
-        if not exact_merge_results.empty:
-            final_parts.append(exact_merge_results)
-        if not partial_merge_results.empty:
-            final_parts.append(partial_merge_results)
-        if not unmerged_final.empty:
-            final_parts.append(unmerged_final)
-        
-        final_df = pd.concat(final_parts, ignore_index=True) if final_parts else pd.DataFrame()
-        self.add_log(f"数据预处理完成，最终剩余 {len(final_df)} 条记录 / Preprocessing finished, {len(final_df)} records remaining.")
-        return final_df
-
-    def create_json_column(self, df):
-        self.add_log("正在创建JSON列 / Creating JSON column...")
-        cols_to_json = [col for col in df.columns if col not in ['Employee ID', 'Violation date', 'Violation type', 'Violation details']]
-        
-        def to_json(row):
-            # Use NumpyEncoder to handle non-standard types like int64
-            data = {col: row[col] for col in cols_to_json if pd.notna(row[col])}
-            if data:
-                return json.dumps(data, ensure_ascii=False, cls=NumpyEncoder)
-            return None
-
-        df['Violation details'] = df.apply(to_json, axis=1)
-        return df[['Employee ID', 'Violation date', 'Violation type', 'Violation details']]
-
-    def parse_json_details(self, df):
-        """
-        Parse JSON values in 'Violation details' column and create separate columns
-        for false_type, false_num, and false_bill_num
-        """
-        self.add_log("正在解析JSON详情字段 / Parsing JSON details field...")
-        
-        # Initialize new columns
-        df['false_type'] = None
-        df['false_num'] = None
-        df['false_bill_num'] = None
-        
-        # Parse each row's JSON data
-        for idx, row in df.iterrows():
-            if pd.notna(row['Violation details']):
-                try:
-                    json_data = json.loads(row['Violation details'])
-                    df.at[idx, 'false_type'] = json_data.get('false_type', None)
-                    df.at[idx, 'false_num'] = json_data.get('false_num', None)
-                    df.at[idx, 'false_bill_num'] = json_data.get('false_bill_num', None)
-                except (json.JSONDecodeError, TypeError) as e:
-                    self.add_log(f"警告: 行 {idx} 的JSON解析失败 / Warning: Failed to parse JSON at row {idx}: {e}")
-        
-        # Remove the original Violation details column
-        df = df.drop('Violation details', axis=1)
-        
-        # Reorder columns to put the new fields after the main fields
-        cols = ['Employee ID', 'Violation date', 'Violation type', 'false_type', 'false_num', 'false_bill_num']
-        df = df[cols]
-        
-        self.add_log("JSON详情解析完成 / JSON details parsing completed.")
-        return df
-
-    def correct_data(self, df, violation_type_int):
-        self.add_log("正在进行最终数据纠正 / Performing final data correction...")
-        
-        # Create original_type_df with parsed JSON fields
-        original_type_df = df.copy()
-        original_type_df = self.parse_json_details(original_type_df)
-        
-        # Process main df
-        df['Violation date'] = df['Violation date'].apply(self.normalize_date)
-        df['Violation type'] = violation_type_int
-        self.add_log(f"Violation type 已统一为 {violation_type_int} / Violation type standardized to {violation_type_int}.")
-        
-        return df, original_type_df
-
     def start_processing(self):
         if not self.file_path_var.get():
             messagebox.showerror("错误 / Error", "请先选择一个Excel文件 / Please select an Excel file first.")
@@ -391,76 +841,161 @@ class ExcelJSONProcessor:
             return
 
         self.process_button.config(state="disabled", text="处理中 / Processing...")
-        thread = threading.Thread(target=self.process_excel, daemon=True)
+        # 控件变量在 Tk 线程读取，工作线程只拿到普通值
+        job = (
+            self.file_path_var.get(), self.output_dir_var.get(), self.prefix_var.get(),
+            self.suffix_type_var.get(), self.custom_suffix_var.get(), int(self.violation_type_int_var.get())
+        )
+        thread = threading.Thread(target=self.process_excel, args=job, daemon=True)
         thread.start()
 
-    def process_excel(self):
+    def process_excel(self, input_file, output_dir, prefix, suffix_type, custom_suffix, violation_type_int):
+        """Worker-thread body: run the pipeline and hand the output path (or the error) back to the Tk thread."""
         try:
-            try:
-                import xlsxwriter
-            except ImportError:
-                raise ImportError("`xlsxwriter` module is not installed. Please install it with `pip install xlsxwriter`.")
-
-            input_file = self.file_path_var.get()
-            output_dir = self.output_dir_var.get()
-            self.status_var.set("正在读取文件 / Reading file...")
-            
-            xls = pd.ExcelFile(input_file)
-            if 'details' not in xls.sheet_names:
-                raise ValueError("Excel文件中必须包含'details'工作表 / Excel file must contain a 'details' sheet.")
-            
-            details_df = pd.read_excel(xls, sheet_name='details')
-            auxiliary_df = pd.read_excel(xls, sheet_name='auxiliary') if 'auxiliary' in xls.sheet_names else pd.DataFrame()
-            self.add_log(f"读取到 {len(details_df)} 条 'details' 记录和 {len(auxiliary_df)} 条 'auxiliary' 记录 / Read {len(details_df)} 'details' records and {len(auxiliary_df)} 'auxiliary' records.")
-
-            # 预处理
-            processed_df = self.preprocess_data(details_df, auxiliary_df, os.path.basename(input_file))
-
-            # JSON转换
-            json_df = self.create_json_column(processed_df)
-
-            # 数据纠正
-            final_df, original_type_df = self.correct_data(json_df, int(self.violation_type_int_var.get()))
-
-            # 生成文件名并保存
-            self.status_var.set("正在生成并保存文件 / Generating and saving file...")
-            prefix = self.prefix_var.get()
-            if self.suffix_type_var.get() == "custom":
-                suffix = self.custom_suffix_var.get() if self.custom_suffix_var.get() else datetime.now().strftime("%m%d")
-            else:
-                suffix = self.extract_date_from_filename(os.path.basename(input_file))
-            
-            output_filename = f"{prefix}-{suffix}.xlsx"
-            output_path = os.path.join(output_dir, output_filename)
-
-            with pd.ExcelWriter(output_path, engine='xlsxwriter', date_format='YYYY-MM-DD', datetime_format='YYYY-MM-DD') as writer:
-                final_df.to_excel(writer, sheet_name='details', index=False)
-                original_type_df.to_excel(writer, sheet_name='details_original_type', index=False)
-                
-                workbook = writer.book
-                worksheet_to_hide = writer.sheets['details_original_type']
-                worksheet_to_hide.hide()
-
-            self.add_log(f"处理完成！文件已保存至 / Processing complete! File saved to: {output_path}")
-            self.status_var.set("处理完成！ / Processing complete!")
-            messagebox.showinfo("成功 / Success", f"文件已成功处理并保存！\nFile processed and saved successfully!\n\n路径 / Path: {output_path}")
+            output_path = self.process_workbook(input_file, output_dir, prefix, suffix_type, custom_suffix, violation_type_int)
+            self.set_status("处理完成！ / Processing complete!")
+            self.process_results.put((output_path, None))
 
         except ImportError as e:
             self.add_log(f"模块缺失错误 / Missing module error: {e}")
             self.add_log("请安装 xlsxwriter 库来解决此问题： pip install xlsxwriter")
-            messagebox.showerror("错误 / Error", f"处理过程中发生错误：\nAn error occurred during processing:\n\n{e}\n\n请安装 xlsxwriter 库：\n Please install the xlsxwriter library: pip install xlsxwriter")
+            self.process_results.put((None, e))
         except Exception as e:
             import traceback
             self.add_log(f"发生错误 / An error occurred: {e}")
             self.add_log(f"Traceback: {traceback.format_exc()}")
-            self.status_var.set(f"错误 / Error: {e}")
-            messagebox.showerror("错误 / Error", f"处理过程中发生错误：\nAn error occurred during processing:\n\n{e}")
-        finally:
-            self.process_button.config(state="normal", text="🚀 开始处理数据 / Start Processing")
+            self.set_status(f"错误 / Error: {e}")
+            self.process_results.put((None, e))
+
+    def finish_processing(self, output_path, error):
+        """Show the result of a run and re-enable the button; runs on the Tk thread."""
+        if error is None:
+            messagebox.showinfo("成功 / Success", f"文件已成功处理并保存！\nFile processed and saved successfully!\n\n路径 / Path: {output_path}")
+        elif isinstance(error, ImportError):
+            messagebox.showerror("错误 / Error", f"处理过程中发生错误：\nAn error occurred during processing:\n\n{error}\n\n请安装 xlsxwriter 库：\n Please install the xlsxwriter library: pip install xlsxwriter")
+        else:
+            messagebox.showerror("错误 / Error", f"处理过程中发生错误：\nAn error occurred during processing:\n\n{error}")
+        self.process_button.config(state="normal", text="🚀 开始处理数据 / Start Processing")
 
     def run(self):
         self.root.mainloop()
 
+
+def _configure_worker_logging(log_queue):
+    """Route this process's log records into the shared queue drained by the CLI's listener."""
+    LOGGER.handlers = [logging.handlers.QueueHandler(log_queue)]
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
+
+
+def _start_cli_logging(log_file=None, log_max_bytes=5 * 1024 * 1024, log_backup_count=5):
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
+    handlers = [console_handler]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=log_max_bytes, backupCount=log_backup_count, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+        handlers.append(file_handler)
+
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    _configure_worker_logging(log_queue)
+    return log_queue, listener
+
+
+def _process_workbook_job(job):
+    """Process-pool entry point: run one workbook through a fresh headless pipeline."""
+    input_file = job['input_file']
+    pipeline = ExcelJSONPipeline(
+        log_prefix=f"[{os.path.basename(input_file)}] ", bill_index_path=job['bill_index_path'], sidecar_format=job['sidecar_format'],
+        fast_json=job['fast_json'], dedup_after=job.get('dedup_after'), dedup_done=job.get('dedup_done')
+    )
+    try:
+        return pipeline.process_workbook(
+            input_file, job['output_dir'], job['prefix'], job['suffix_type'], job['custom_suffix'], job['violation_type_int']
+        )
+    finally:
+        # 读取失败等未到达去重步骤的情况也要放行后续工作簿
+        if job.get('dedup_done') is not None:
+            job['dedup_done'].set()
+
+
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(description="虚假类警告信Json转换处理脚本 (无界面批量模式) / False Warning Letter Json Conversion (headless batch mode)")
+    parser.add_argument("--headless", action="store_true", help="命令行运行时必须指定；不带任何参数运行则打开图形界面 / Required on the command line; run without arguments to open the window")
+    parser.add_argument("inputs", nargs='+', help="源Excel文件或通配符 / Source Excel files or glob patterns")
+    parser.add_argument("-o", "--output-dir", required=True, help="输出目录 / Output directory")
+    parser.add_argument("--prefix", default="虚假妥投警告信", help="文件名前缀 / Filename prefix")
+    parser.add_argument("--suffix-mode", choices=["auto", "custom"], default="auto", help="auto: 从文件名提取MMDD / extract MMDD from filename; custom: 使用 --custom-suffix")
+    parser.add_argument("--custom-suffix", default="", help="自定义后缀 / Custom suffix (default: today's MMDD)")
+    parser.add_argument("--violation-type-code", type=int, default=19, help="违规类型代码 / Violation type code")
+    parser.add_argument("--bill-index", default=None, help="历史单号索引文件 (sqlite)，用于跨月去重 / Persistent bill number index (sqlite) for dedup across runs")
+    parser.add_argument("--sidecar", choices=["csv", "parquet"], default=None, help="额外输出 details 的 CSV/Parquet 文件 / Also write the details sheet as CSV or Parquet")
+    parser.add_argument("--fast-json", action="store_true", help="使用 orjson 读写JSON（紧凑格式，NaN/Infinity 写为 null）/ Use orjson for JSON (compact output, NaN/Infinity written as null)")
+    parser.add_argument("--log-file", default=None, help="滚动日志文件 / Rotating log file for the run")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="并行进程数 / Number of worker processes")
+    args = parser.parse_args(argv)
+
+    input_files = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        input_files.extend(path for path in matches if path not in input_files)
+    if not input_files:
+        parser.error("未找到匹配的输入文件 / No input files matched.")
+    if not os.path.isdir(args.output_dir):
+        parser.error(f"输出目录不存在 / Output directory does not exist: {args.output_dir}")
+
+    # 同名输出会相互覆盖，提前拦截
+    naming = ExcelJSONPipeline()
+    output_names = {}
+    for input_file in input_files:
+        output_name = naming.build_output_filename(input_file, args.prefix, args.suffix_mode, args.custom_suffix)
+        if output_name in output_names:
+            parser.error(f"{input_file} 与 {output_names[output_name]} 的输出文件名相同 / both map to output file '{output_name}'.")
+        output_names[output_name] = input_file
+
+    jobs = [{
+        'input_file': input_file, 'output_dir': args.output_dir, 'prefix': args.prefix, 'suffix_type': args.suffix_mode,
+        'custom_suffix': args.custom_suffix, 'violation_type_int': args.violation_type_code, 'bill_index_path': args.bill_index,
+        'sidecar_format': args.sidecar, 'fast_json': args.fast_json
+    } for input_file in input_files]
+
+    # 共用历史索引时，各工作簿按输入顺序轮流预留单号：同一单号总由靠前的工作簿发出，与 -j 无关
+    manager = multiprocessing.Manager() if args.bill_index and len(jobs) > 1 else None
+    if manager is not None:
+        turns = [manager.Event() for _ in jobs]
+        for position, job in enumerate(jobs):
+            job['dedup_after'] = turns[position - 1] if position else None
+            job['dedup_done'] = turns[position]
+
+    log_queue, listener = _start_cli_logging(args.log_file)
+    if args.fast_json and orjson is None:
+        LOGGER.warning("未安装 orjson，使用标准库 json / orjson is not installed, falling back to the stdlib json module.")
+    failures = 0
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(jobs))), initializer=_configure_worker_logging, initargs=(log_queue,)) as executor:
+            futures = {executor.submit(_process_workbook_job, job): job['input_file'] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures += 1
+                    LOGGER.error(f"[{os.path.basename(futures[future])}] 发生错误 / An error occurred: {e}")
+
+        LOGGER.info(f"完成 {len(jobs) - failures}/{len(jobs)} 个文件 / Finished {len(jobs) - failures}/{len(jobs)} workbooks.")
+    finally:
+        listener.stop()
+        if manager is not None:
+            manager.shutdown()
+    return 1 if failures else 0
+
+
 if __name__ == "__main__":
+    # 由显式的 --headless 参数选择无界面模式，而不是看有没有命令行参数
+    if "--headless" in sys.argv[1:]:
+        sys.exit(run_cli())
+    if len(sys.argv) > 1:
+        sys.exit("命令行运行需要 --headless 参数 / Command-line runs need --headless (see --headless --help)")
     app = ExcelJSONProcessor()
     app.run()
@@ -0,0 +1,170 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# 设置为 1 时额外采集 cProfile / tracemalloc 数据（开销较大，默认关闭）
+# Set to 1 to also capture cProfile / tracemalloc data (expensive, off by default)
+PROFILE_ENV_VAR = "PERF_METRICS_PROFILE"
+TRACEMALLOC_ENV_VAR = "PERF_METRICS_TRACEMALLOC"
+
+PROFILE_TOP_FUNCTIONS = 30
+TRACEMALLOC_TOP_LINES = 15
+
+
+class RunMetrics:
+    """
+    Per-run instrumentation shared by the warning-letter tools: stage timers, counters and
+    optional cProfile / tracemalloc capture, written out as a metrics JSON file next to the
+    run's outputs. Stages may run on several threads at once; their time is summed per call,
+    so stage totals can exceed the wall-clock time of the run. When profiling is on, every
+    outermost stage is profiled on the thread that runs it and the results are merged. Python
+    3.12+ allows only one active profiler per process, so an outermost stage that starts while
+    another thread is profiling runs unprofiled and is counted under "stages not profiled".
+    """
+    def __init__(self, tool, profile=None, trace_memory=None, **info):
+        self.tool = tool
+        self.info = dict(info)
+        self.stages = {}
+        self.counters = {}
+        self.profile = self._env_flag(PROFILE_ENV_VAR) if profile is None else bool(profile)
+        self.trace_memory = self._env_flag(TRACEMALLOC_ENV_VAR) if trace_memory is None else bool(trace_memory)
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._started = time.perf_counter()
+        self._elapsed = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile_stats = None
+        self._memory = None
+        # 由本对象开启的 tracemalloc 才由本对象关闭，避免影响外部调用者
+        self._owns_tracemalloc = self.trace_memory and not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+
+    @staticmethod
+    def _env_flag(name):
+        return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "y")
+
+    def start(self, name):
+        """Start timing a named stage on this thread; end it with stop(name). Nested stages are timed too."""
+        with self._lock:
+            # 在进入时登记，嵌套环节排在外层环节之后
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        profiler = None
+        open_stages = self._open_stages()
+        # 只对最外层环节做 cProfile
+        if self.profile and not open_stages:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ 同一进程只能有一个活动的分析器，其他线程正在分析时本环节不分析
+                profiler = None
+                self.count("stages not profiled")
+        open_stages.append((name, stage, profiler, time.perf_counter()))
+
+    def stop(self, name):
+        """End the innermost stage started on this thread, which must be `name`."""
+        end = time.perf_counter()
+        open_stages = self._open_stages()
+        if not open_stages or open_stages[-1][0] != name:
+            raise RuntimeError(f"Stage '{name}' is not the innermost running stage on this thread.")
+        _, stage, profiler, start = open_stages.pop()
+        if profiler is not None:
+            profiler.disable()
+        with self._lock:
+            stage["seconds"] += end - start
+            stage["calls"] += 1
+            if profiler is not None:
+                if self._profile_stats is None:
+                    self._profile_stats = pstats.Stats(profiler)
+                else:
+                    self._profile_stats.add(profiler)
+
+    def stop_all(self):
+        """End every stage still open on this thread, innermost first; for error paths that skipped their stop() calls."""
+        for name, _, _, _ in reversed(self._open_stages()[:]):
+            self.stop(name)
+
+    @contextmanager
+    def stage(self, name):
+        """Time one call of a named stage, like a start(name) / stop(name) pair around the block."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def _open_stages(self):
+        open_stages = getattr(self._local, 'open_stages', None)
+        if open_stages is None:
+            open_stages = self._local.open_stages = []
+        return open_stages
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.info[name] = value
+
+    def summary(self):
+        """List of (stage, total seconds, calls) in the order the stages first ran."""
+        with self._lock:
+            return [(name, stage["seconds"], stage["calls"]) for name, stage in self.stages.items()]
+
+    @property
+    def elapsed(self):
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+
+    def finish(self):
+        """Freeze the run time and collect the tracemalloc results; safe to call more than once."""
+        if self._elapsed is not None:
+            return
+        self._elapsed = time.perf_counter() - self._started
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:TRACEMALLOC_TOP_LINES]
+            self._memory = {
+                "current_mb": round(current / 1048576, 3), "peak_mb": round(peak / 1048576, 3),
+                "top_allocations": [{"location": str(stat.traceback), "size_mb": round(stat.size / 1048576, 3), "count": stat.count} for stat in top]
+            }
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "tool": self.tool, "started_at": self.started_at, "elapsed_seconds": round(self.elapsed, 4),
+                "info": dict(self.info), "counters": dict(self.counters),
+                "stages": [{"name": name, "seconds": round(stage["seconds"], 4), "calls": stage["calls"]} for name, stage in self.stages.items()]
+            }
+            if self._memory is not None:
+                data["memory"] = self._memory
+            if self._profile_stats is not None:
+                data["profile_top_functions"] = self._top_functions()
+        return data
+
+    def _top_functions(self):
+        rows = []
+        stats = self._profile_stats.stats
+        for func in sorted(stats, key=lambda f: stats[f][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]:
+            primitive_calls, calls, own_time, cumulative_time, _ = stats[func]
+            rows.append({"function": pstats.func_std_string(func), "calls": calls, "own_seconds": round(own_time, 4), "cumulative_seconds": round(cumulative_time, 4)})
+        return rows
+
+    def write(self, path):
+        """Finish the run and write the metrics JSON to `path` (plus a .prof file when profiling); returns `path`."""
+        self.finish()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        if self._profile_stats is not None:
+            # 完整的 cProfile 数据可用 pstats / snakeviz 打开
+            self._profile_stats.dump_stats(os.path.splitext(path)[0] + ".prof")
+        return path
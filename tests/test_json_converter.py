@@ -0,0 +1,312 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from statistics import StatisticsError, mode
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(REPO_ROOT, "Json转化处理工具-场景定制版V2.0.py")
+
+
+def load_json_tool():
+    sys.path.insert(0, REPO_ROOT)
+    try:
+        spec = importlib.util.spec_from_file_location("json_tool", SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        # 注册后批量模式的进程池才能按模块名找到任务函数
+        sys.modules["json_tool"] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(REPO_ROOT)
+    return module
+
+
+json_tool = load_json_tool()
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = json_tool.ExcelJSONPipeline()
+    pipeline.add_log = lambda message: None
+    return pipeline
+
+
+def make_details(seed, rows=400, employees=40):
+    """Details sheet with repeated keys, missing dates, unparseable dates and missing Employee IDs."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Employee ID': rng.integers(1000, 1000 + employees, rows).astype(object),
+        'Violation date': (pd.Timestamp('2023-12-20') + pd.to_timedelta(rng.integers(0, 30, rows), 'D')).astype(object),
+        'Violation type': rng.choice(['严厉Stern', '口述Verbal', 'other'], rows),
+        'false_type': rng.choice(['虚假妥投', '虚假标记', None], rows),
+        'false_num': rng.integers(1, 4, rows),
+        'false_bill_num': [f"SF{x}" for x in rng.integers(10**9, 10**10, rows)],
+    })
+    df.loc[rng.random(rows) < 0.05, 'Violation date'] = None
+    df.loc[rng.random(rows) < 0.03, 'Violation date'] = 'bad'
+    df.loc[rng.random(rows) < 0.03, 'Employee ID'] = None
+    # 与 preprocess_data 的初始清理一致
+    df['Violation date'] = pd.to_datetime(df['Violation date'], errors='coerce').dt.date
+    return df
+
+
+# --- 逐行合并的原始实现（向量化之前的 preprocess_data 步骤3/4），作为对照 ---
+
+def per_row_exact_merge(pipeline, details_df):
+    rows, merged_indices = [], []
+    for _, group in details_df.groupby(['Employee ID', 'Violation date', 'Violation type']):
+        if len(group) > 1:
+            merged_indices.extend(group.index.tolist())
+            new_row = group.iloc[0].copy()
+            new_row['false_bill_num'] = ",".join(group['false_bill_num'].astype(str))
+            new_row['false_num'] = group['false_num'].sum()
+            new_row['Violation type'] = pipeline.determine_violation_type(group['Violation type'])
+            rows.append(new_row.to_frame().T)
+    unmerged = details_df.loc[~details_df.index.isin(merged_indices)]
+    merged = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    return merged, unmerged, len(merged_indices)
+
+
+def per_row_partial_merge(pipeline, unmerged_after_exact, month_day):
+    rows, merged_indices = [], []
+    for _, group in unmerged_after_exact.groupby(['Employee ID', 'Violation type']):
+        if len(group) >= 3:
+            merged_indices.extend(group.index.tolist())
+            labels = [
+                f"{row['false_bill_num']}({pipeline.normalize_date(row['Violation date'])})"
+                if pd.notna(row['Violation date']) else str(row['false_bill_num'])
+                for _, row in group.iterrows()
+            ]
+            new_row = group.iloc[0].copy()
+            new_row['false_bill_num'] = ",".join(labels)
+            new_row['false_num'] = group['false_num'].sum()
+            new_row['Violation type'] = pipeline.determine_upgraded_violation_type(group['Violation type'])
+            try:
+                year_mode = mode(d.year for d in group['Violation date'].dropna())
+            except StatisticsError:
+                year_mode = datetime.now().year
+            new_row['Violation date'] = pd.to_datetime(f"{year_mode}-{month_day[:2]}-{month_day[2:]}").date()
+            rows.append(new_row.to_frame().T)
+    unmerged = unmerged_after_exact.loc[~unmerged_after_exact.index.isin(merged_indices)]
+    merged = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    return merged, unmerged, len(merged_indices)
+
+
+def assert_same_rows(expected, actual):
+    # 逐行实现得到 object 列，比较字符串形式即可覆盖取值与顺序
+    assert list(expected.columns) == list(actual.columns)
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True).astype(str), actual.reset_index(drop=True).astype(str))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_exact_merge_matches_per_row_merge(pipeline, seed):
+    details = make_details(seed)
+    expected = per_row_exact_merge(pipeline, details)
+    actual = pipeline.exact_merge(details)
+    assert_same_rows(expected[0], actual[0])
+    assert expected[1].index.equals(actual[1].index)
+    assert expected[2] == actual[2]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_partial_merge_matches_per_row_merge(pipeline, seed):
+    _, unmerged_after_exact, _ = pipeline.exact_merge(make_details(seed, employees=25))
+    expected = per_row_partial_merge(pipeline, unmerged_after_exact, "0307")
+    actual = pipeline.partial_merge(unmerged_after_exact, "0307")
+    assert_same_rows(expected[0], actual[0])
+    assert expected[1].index.equals(actual[1].index)
+    assert expected[2] == actual[2]
+
+
+def test_merges_without_candidates(pipeline):
+    details = make_details(0, rows=5, employees=5000)
+    merged, unmerged, count = pipeline.exact_merge(details)
+    assert merged.empty and count == 0 and unmerged.index.equals(details.index)
+    merged, unmerged, count = pipeline.partial_merge(details, "0307")
+    assert merged.empty and count == 0 and unmerged.index.equals(details.index)
+
+
+def make_payloads():
+    return pd.DataFrame({
+        'Employee ID': [1, 2, 3, 4],
+        'Violation date': [None] * 4,
+        'Violation type': ['口述Verbal'] * 4,
+        'false_type': ['虚假妥投', '虚假标记', None, 'quote " and \\ and \n'],
+        'false_num': [1, 2, 3, 4],
+        'false_bill_num': ['SF1', None, 'SF3', 'SF4'],
+        'amount': [0.1, 1e16, float('inf'), np.nan],
+        'mixed': pd.Series([np.int64(7), np.float64(2.5), 'x', None], dtype=object),
+    })
+
+
+def per_row_payloads(df, cols_to_json):
+    # 列式序列化之前的逐行 df.apply 实现
+    def to_json(row):
+        data = {col: row[col] for col in cols_to_json if pd.notna(row[col])}
+        return json.dumps(data, ensure_ascii=False, cls=json_tool.NumpyEncoder) if data else None
+    return df.apply(to_json, axis=1)
+
+
+PAYLOAD_COLUMNS = ['false_type', 'false_num', 'false_bill_num', 'amount', 'mixed']
+
+
+def test_default_serialization_is_stdlib_output(pipeline):
+    df = make_payloads()
+    # 即使安装了 orjson，默认输出也必须与标准库逐字节一致
+    assert not pipeline.fast_json
+    expected = per_row_payloads(df, PAYLOAD_COLUMNS)
+    assert pipeline.serialize_json_payloads(df, PAYLOAD_COLUMNS).tolist() == expected.tolist()
+    assert '1e+16' in expected[1] and 'Infinity' in expected[2]
+
+
+@pytest.mark.skipif(json_tool.orjson is None, reason="orjson is not installed")
+def test_fast_json_matches_stdlib_values():
+    df = make_payloads()
+    stdlib = json_tool.ExcelJSONPipeline().serialize_json_payloads(df, PAYLOAD_COLUMNS)
+    fast = json_tool.ExcelJSONPipeline(fast_json=True).serialize_json_payloads(df, PAYLOAD_COLUMNS)
+    # 格式不同（紧凑分隔符、浮点写法），解析后的取值相同；非有限浮点数写为 null
+    assert fast[0] != stdlib[0]
+    for row in (0, 1, 3):
+        assert json.loads(fast[row]) == json.loads(stdlib[row])
+    assert json.loads(fast[2])['amount'] is None
+    assert json.loads(stdlib[2])['amount'] == float('inf')
+
+
+def test_default_parsing_accepts_stdlib_non_finite_floats(pipeline):
+    df = pd.DataFrame({
+        'Employee ID': [1], 'Violation date': [None], 'Violation type': ['口述Verbal'],
+        'Violation details': ['{"false_type": "虚假妥投", "false_num": NaN, "false_bill_num": "SF1"}'],
+    })
+    parsed = pipeline.parse_json_details(df)
+    assert parsed.loc[0, 'false_bill_num'] == 'SF1'
+    assert np.isnan(parsed.loc[0, 'false_num'])
+
+
+def test_bill_index_reserve_and_release(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    with json_tool.BillNumberIndex(path) as index:
+        first = index.reserve(pd.Series(['sf1', 'SF2 ', 3.0]), source='a.xlsx', issued=pd.Series(['SF9']))
+        assert not first.any()
+    with json_tool.BillNumberIndex(path) as index:
+        # 其他来源已预留或 auxiliary 中已发出的单号视为重复，同一来源重跑不受影响
+        assert index.reserve(pd.Series(['SF1', '3', 'SF9', 'SF4']), source='b.xlsx').tolist() == [True, True, True, False]
+        assert not index.reserve(pd.Series(['SF1', 'SF2']), source='a.xlsx').any()
+        index.release()
+    with json_tool.BillNumberIndex(path) as index:
+        assert index.reserve(pd.Series(['SF4']), source='c.xlsx').tolist() == [False]
+
+
+def write_workbook(path, details, auxiliary):
+    with pd.ExcelWriter(path) as writer:
+        details.to_excel(writer, sheet_name='details', index=False)
+        auxiliary.to_excel(writer, sheet_name='auxiliary', index=False)
+
+
+def test_batch_dedup_does_not_depend_on_worker_count(tmp_path):
+    details = make_details(3, rows=600, employees=120)
+    details['Violation date'] = details['Violation date'].astype(str)
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    # 相邻工作簿之间有重叠的单号
+    for name, rows in [("a 0314.xlsx", slice(0, 300)), ("b 0316.xlsx", slice(200, 500)), ("c 0318.xlsx", slice(400, 600))]:
+        write_workbook(inputs / name, details.iloc[rows], pd.DataFrame({'false_bill_num': details['false_bill_num'].iloc[590:]}))
+
+    outputs = {}
+    for workers in (1, 3):
+        output_dir = tmp_path / f"out_j{workers}"
+        output_dir.mkdir()
+        argv = [str(inputs / "*.xlsx"), "-o", str(output_dir), "-j", str(workers), "--bill-index", str(output_dir / "index.sqlite")]
+        assert json_tool.run_cli(argv) == 0
+        outputs[workers] = {path.name: pd.read_excel(path) for path in sorted(output_dir.glob("*.xlsx"))}
+
+    assert outputs[1].keys() == outputs[3].keys() and len(outputs[1]) == 3
+    for name, frame in outputs[1].items():
+        pd.testing.assert_frame_equal(frame, outputs[3][name])
+
+
+
+def test_bill_index_tells_same_named_workbooks_apart(tmp_path):
+    details = make_details(4, rows=300, employees=60)
+    details['Violation date'] = details['Violation date'].astype(str)
+    auxiliary = pd.DataFrame({'false_bill_num': ['SF0']})
+    # 不同月份目录下的同名工作簿，单号部分重叠
+    for month, rows in [("2024-03", slice(0, 200)), ("2024-04", slice(100, 300))]:
+        (tmp_path / month).mkdir()
+        write_workbook(tmp_path / month / "a 0314.xlsx", details.iloc[rows], auxiliary)
+    index_path = str(tmp_path / "index.sqlite")
+
+    def run(month, name):
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        assert json_tool.run_cli([str(tmp_path / month / "a 0314.xlsx"), "-o", str(output_dir), "-j", "1", "--bill-index", index_path]) == 0
+        return pd.read_excel(next(output_dir.glob("*.xlsx")), sheet_name='details_original_type')
+
+    march = run("2024-03", "out_march")
+    april = run("2024-04", "out_april")
+    def bills(frame):
+        # 部分合并的单号写成 "单号(日期)"，以逗号连接
+        return set(frame['false_bill_num'].str.split(',').explode().str.replace(r'\(.*\)$', '', regex=True))
+
+    march_bills, april_bills = bills(march), bills(april)
+    assert not march_bills & april_bills and len(april_bills) < 200
+    # 同一份文件重跑时不把自己预留的单号当作重复
+    pd.testing.assert_frame_equal(run("2024-03", "out_march_rerun"), march)
+
+
+@pytest.mark.parametrize("engine", ["openpyxl", "calamine"])
+def test_sheet_reader_turns_error_cells_into_nan(tmp_path, monkeypatch, engine):
+    if engine == "calamine":
+        pytest.importorskip("python_calamine")
+    monkeypatch.setattr(json_tool, "EXCEL_READ_ENGINE", engine)
+    from openpyxl import load_workbook
+    path = str(tmp_path / "errors 0314.xlsx")
+    details = make_details(5, rows=60, employees=10)
+    details['Violation date'] = details['Violation date'].astype(str)
+    write_workbook(path, details, pd.DataFrame({'false_bill_num': ['SF1', 'SF2'], 'other': [1, 2]}))
+    # 把几个 false_num 单元格改成 Excel 错误值
+    workbook = load_workbook(path)
+    for row, code in [(2, '#DIV/0!'), (5, '#N/A'), (9, '#VALUE!')]:
+        workbook['details'].cell(row=row, column=details.columns.get_loc('false_num') + 1).value = code
+    workbook.save(path)
+
+    sheets = json_tool.ExcelJSONPipeline().read_workbook_sheets(path, {'details': None, 'auxiliary': ['false_bill_num'], 'missing': None})
+    pd.testing.assert_frame_equal(sheets['details'], pd.read_excel(path, sheet_name='details', engine=engine))
+    assert sheets['details']['false_num'].isna().sum() == 3
+    assert list(sheets['auxiliary'].columns) == ['false_bill_num'] and sheets['missing'] is None
+
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    assert json_tool.run_cli([path, "-o", str(output_dir), "-j", "1"]) == 0
+    output = pd.read_excel(next(output_dir.glob("*.xlsx")), sheet_name=None)
+    assert not any(frame.astype(str).apply(lambda column: column.str.contains('#DIV/0!|#N/A|#VALUE!')).any().any() for frame in output.values())
+
+
+def run_script(*args):
+    # 以 __main__ 方式运行脚本，并报告运行结束时是否导入了 tkinter
+    code = (
+        "import runpy, sys\n"
+        f"sys.argv = [{SCRIPT_PATH!r}, *{list(args)!r}]\n"
+        "try:\n"
+        f"    runpy.run_path({SCRIPT_PATH!r}, run_name='__main__')\n"
+        "finally:\n"
+        "    print('tkinter imported:', 'tkinter' in sys.modules)\n"
+    )
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_ROOT, timeout=120)
+
+
+def test_headless_flag_runs_cli_without_tkinter():
+    result = run_script("--headless", "--help")
+    assert result.returncode == 0
+    assert "--headless" in result.stdout and "tkinter imported: False" in result.stdout
+
+
+def test_arguments_without_headless_flag_are_rejected():
+    result = run_script("input.xlsx", "-o", ".")
+    assert result.returncode != 0
+    assert "--headless" in result.stderr and "tkinter imported: False" in result.stdout
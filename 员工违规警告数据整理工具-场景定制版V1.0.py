@@ -3,6 +3,7 @@ from tkinter import ttk, filedialog, messagebox
 import pandas as pd
 import re
 import os
+from perf_metrics import RunMetrics  # 同目录下的共享性能统计模块 / shared instrumentation module next to this script
 from datetime import datetime
 
 class ExcelProcessorApp:
@@ -83,14 +84,20 @@ class ExcelProcessorApp:
             messagebox.showerror("错误 / Error", "请确保两个表格文件都已选择！\nPlease ensure both files are selected!")
             return
 
+        metrics = RunMetrics("warning_processor", file_a=self.file_a_path.get(), file_b=self.file_b_path.get(), date_suffix=self.date_suffix.get())
         try:
             self.update_status("正在读取文件... / Reading files...")
             # --- 1. 读取数据 ---
+            metrics.start("read")
             df_a = pd.read_excel(self.file_a_path.get(), sheet_name='details_original_type')
             df_b = pd.read_excel(self.file_b_path.get(), sheet_name='details')
+            metrics.stop("read")
+            metrics.count("file A rows", len(df_a))
+            metrics.count("file B rows", len(df_b))
 
             # --- 2. 数据预处理 ---
             self.update_status("正在进行数据预处理... / Preprocessing data...")
+            metrics.start("preprocess")
             if '电话' in df_b.columns:
                 df_b = df_b.drop(columns=['电话'])
             
@@ -100,9 +107,11 @@ class ExcelProcessorApp:
                 df_b.loc[df_b['违规类型'].str.contains('虚假标记', na=False), '违规类型'] = '虚假标记'
             else:
                 raise KeyError("表格B中缺少关键字段【违规类型】/ Missing required column in File B: [违规类型]")
+            metrics.stop("preprocess")
             
             # --- 3. 自动化匹配与初始化 ---
             self.update_status("正在匹配数据并初始化列... / Matching data and initializing columns...")
+            metrics.start("match")
             df_b['辅助列-Waybill'] = df_b['违规详情'].apply(self.extract_bill_num)
             violation_map = pd.Series(df_a['Violation type'].values, index=df_a['false_bill_num']).to_dict()
             df_b['辅助1'] = pd.NA
@@ -113,7 +122,9 @@ class ExcelProcessorApp:
             if toutou_mask.any():
                 extracted_nums = df_b.loc[toutou_mask, '违规详情'].apply(self.extract_bill_num)
                 df_b.loc[toutou_mask, '辅助1'] = extracted_nums.map(violation_map)
+            metrics.stop("match")
 
+            metrics.start("rules")
             df_b['警告信发出建议'] = ''
             df_b['发送方式'] = ''
             processed_mask = pd.Series([False] * len(df_b), index=df_b.index)
@@ -196,6 +207,11 @@ class ExcelProcessorApp:
             mask_fallback = biaoji_mask & ~processed_mask
             df_b.loc[mask_fallback, ['警告信发出建议', '发送方式']] = ['Manual Recheck', 'Single Send']
             processed_mask |= mask_fallback
+            metrics.stop("rules")
+            metrics.count("虚假妥投 rows", int(toutou_mask.sum()))
+            metrics.count("虚假标记 rows", int(biaoji_mask.sum()))
+            metrics.count("matched bill numbers", int(df_b['辅助1'].notna().sum()))
+            metrics.count("manual recheck rows", int((df_b['警告信发出建议'] == 'Manual Recheck').sum()))
             
             self.update_status("处理完成，请选择保存位置。/ Processing complete, please select a save location.")
             # --- 7. 保存结果 ---
@@ -207,9 +223,17 @@ class ExcelProcessorApp:
             )
 
             if save_path:
+                metrics.start("write")
                 df_b.to_excel(save_path, index=False)
+                metrics.stop("write")
+                # 本次运行的性能统计写在输出文件旁；写入失败不影响已保存的结果 / per-run metrics next to the output file
+                metrics_note = ""
+                try:
+                    metrics.write(os.path.splitext(save_path)[0] + "_metrics.json")
+                except Exception as e:
+                    metrics_note = f"\n\n运行指标未能保存 / Run metrics could not be saved: {e}"
                 self.update_status(f"文件已成功保存! / File saved successfully!", color="green")
-                messagebox.showinfo("成功 / Success", f"处理完成！文件已保存至：\n{save_path}\n\nProcessing Complete! File saved to:\n{save_path}")
+                messagebox.showinfo("成功 / Success", f"处理完成！文件已保存至：\n{save_path}\n\nProcessing Complete! File saved to:\n{save_path}{metrics_note}")
             else:
                 self.update_status("用户取消了保存操作。/ Save operation cancelled by user.", color="orange")
 
@@ -222,6 +246,9 @@ class ExcelProcessorApp:
         except Exception as e:
             messagebox.showerror("发生未知错误 / Unknown Error", str(e))
             self.update_status(f"操作失败：{e} / Operation failed: {e}", color="red")
+        finally:
+            # 出错时跳过了 stop()，在这里结束仍未结束的环节并关闭 cProfile / close stages an error left open
+            metrics.stop_all()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+import argparse
+import logging
+import logging.handlers
+import sys
 import pandas as pd
+import numpy as np
 import smtplib
 import threading
 from email.mime.multipart import MIMEMultipart
@@ -8,93 +11,452 @@ from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from email import encoders
 import os
+import io
 import re
+import queue
+import time
+import json
+import hashlib
+import sqlite3
+import heapq
+import itertools
+import random
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from perf_metrics import RunMetrics  # 同目录下的共享性能统计模块 / shared instrumentation module next to this script
 
-class EmailSenderApp(tk.Tk):
+# tkinter 只在创建窗口时导入，--headless 模式启动时完全不导入 / tkinter is imported only when the window is built, never in --headless mode
+tk = ttk = filedialog = messagebox = None
+
+
+def _import_tkinter():
+    global tk, ttk, filedialog, messagebox
+    if tk is None:
+        import tkinter as tk
+        from tkinter import ttk, filedialog, messagebox
+
+
+LOGGER = logging.getLogger("EmailSender")
+
+# 后台加载结果的轮询间隔（毫秒）
+LOAD_POLL_INTERVAL_MS = 100
+
+# 界面日志队列与刷新参数 / Tk log sink settings
+LOG_QUEUE_SIZE = 10000
+LOG_DRAIN_INTERVAL_MS = 100
+LOG_MAX_LINES = 5000
+
+try:
+    import xlsxwriter  # 可选依赖：安装后以常量内存模式写附件 / optional, faster write-only xlsx engine
+    ATTACHMENT_WRITER_ENGINE = 'xlsxwriter'
+except ImportError:
+    ATTACHMENT_WRITER_ENGINE = 'openpyxl'
+
+# 超过该行数的附件用常量内存模式逐行写出，较小的附件完全在内存中生成（不产生临时文件）
+ATTACHMENT_CONSTANT_MEMORY_ROWS = 50000
+
+# 临时发送失败的重试间隔（秒）：从基础间隔起每次翻倍，不超过上限，并加入随机抖动
+SEND_RETRY_BASE_DELAY = 5.0
+SEND_RETRY_MAX_DELAY = 300.0
+
+
+class SMTPSession:
+    """An authenticated SMTP connection and the number of messages sent over it."""
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+
+
+class SMTPSessionPool:
     """
-    An automated tool for batch sending emails, specifically for processing historical warning letters.
+    Reuses authenticated SMTP connections across messages instead of opening, logging in
+    and closing one per email. A connection is retired after max_messages_per_connection
+    messages, and a dropped connection is replaced transparently and the message retried once.
+    Set use_ssl=False (and username=None) to point it at a local plain-SMTP test server.
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, host, port, username, password, max_messages_per_connection=50, max_connections=1, use_ssl=True, timeout=60, log=None):
+        self.host, self.port = host, int(port)
+        self.username, self.password = username, password
+        self.max_messages_per_connection = max(1, int(max_messages_per_connection))
+        self.use_ssl, self.timeout = use_ssl, timeout
+        self.log = log or (lambda message: None)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, int(max_connections)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self):
+        self.log(f"Connecting to SMTP server: {self.host}:{self.port}...")
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.username:
+                server.login(self.username, self.password)
+                self.log("Server login successful.")
+        except Exception:
+            self._quit(SMTPSession(server))
+            raise
+        return SMTPSession(server)
+
+    def _quit(self, session):
+        try:
+            session.server.quit()
+        except Exception:
+            session.server.close()
 
-        # --- Language Configuration ---
-        self.LANG = {
-            'zh': {
-                "title": "自动化邮件批量发送工具-历史警告信数据处理专版",
-                "quick_actions": "快捷操作",
-                "load_config": "从文件加载配置",
-                "lang_switch": "语言 (Language)",
-                "sender_settings": "1. 发件人设置 (推荐: 腾讯企业邮箱)",
-                "smtp_server": "SMTP服务器:",
-                "smtp_port": "SMTP端口:",
-                "sender_email": "发件人邮箱:",
-                "email_auth_code": "邮箱授权码:",
-                "data_files": "2. 数据与文件选择",
-                "select_source_file": "选择原始数据文件 (Excel):",
-                "browse": "浏览...",
-                "select_split_field": "选择用于拆分的字段:",
-                "english_config": "全英文处理配置 - 选择需要英文处理的拆分值:",
-                "select_mapping_file": "选择邮箱映射关系文件 (Excel):",
-                "select_save_location": "选择拆分后表格保存位置:",
-                "email_content": "3. 邮件内容配置",
-                "subject_prefix": "邮件主题 (前缀):",
-                "use_filename_as_prefix": "使用源文件名作为前缀",
-                "cc_recipients": "抄送人员 (多个用英文分号';'隔开):",
-                "chinese_prefix": "中文邮件正文前缀:",
-                "chinese_suffix": "中文邮件正文后缀:",
-                "english_prefix": "英文邮件正文前缀:",
-                "english_suffix": "英文邮件正文后缀:",
-                "execution_progress": "4. 执行与进度",
-                "execute_button": "一键执行 (包含中英文智能处理)",
-                "success_title": "成功",
-                "config_loaded_msg": "已从文件成功加载配置。",
-                "error_title": "错误",
-                "config_load_error_msg": "无法读取或解析配置文件。\n请确保文件是两列（Key, Value）并且格式正确。\n\n错误详情: {}",
-                "file_read_error_msg": "无法读取文件表头或映射列: {}",
-                "all_tasks_complete_title": "完成",
-                "all_tasks_complete_msg": "所有邮件已成功发送！包含中英文智能处理和统计分析功能。",
-                "execution_error_title": "执行出错",
-                "execution_error_msg": "任务中断，请检查日志窗口中的错误信息。\n\n错误详情: {}"
-            },
-            'en': {
-                "title": "Automated Bulk Email Sender - Warning Letter Edition",
-                "quick_actions": "Quick Actions",
-                "load_config": "Load Config from File",
-                "lang_switch": "Language (语言)",
-                "sender_settings": "1. Sender Settings (Recommended: Tencent Exmail)",
-                "smtp_server": "SMTP Server:",
-                "smtp_port": "SMTP Port:",
-                "sender_email": "Sender Email:",
-                "email_auth_code": "Authorization Code:",
-                "data_files": "2. Data and File Selection",
-                "select_source_file": "Select Source Data File (Excel):",
-                "browse": "Browse...",
-                "select_split_field": "Select Field for Splitting:",
-                "english_config": "English Processing - Select values to process in English:",
-                "select_mapping_file": "Select Email Mapping File (Excel):",
-                "select_save_location": "Select Save Location for Split Files:",
-                "email_content": "3. Email Content Configuration",
-                "subject_prefix": "Email Subject (Prefix):",
-                "use_filename_as_prefix": "Use source filename as prefix",
-                "cc_recipients": "CC (separate multiple with ';'):",
-                "chinese_prefix": "Chinese Email Body Prefix:",
-                "chinese_suffix": "Chinese Email Body Suffix:",
-                "english_prefix": "English Email Body Prefix:",
-                "english_suffix": "English Email Body Suffix:",
-                "execution_progress": "4. Execution and Progress",
-                "execute_button": "Execute All (with Smart CN/EN Handling)",
-                "success_title": "Success",
-                "config_loaded_msg": "Configuration has been successfully loaded from the file.",
-                "error_title": "Error",
-                "config_load_error_msg": "Could not read or parse the configuration file.\nPlease ensure it has two columns (Key, Value) and is correctly formatted.\n\nDetails: {}",
-                "file_read_error_msg": "Could not read file headers or map columns: {}",
-                "all_tasks_complete_title": "Complete",
-                "all_tasks_complete_msg": "All emails have been sent successfully! Includes smart CN/EN handling and statistical analysis.",
-                "execution_error_title": "Execution Error",
-                "execution_error_msg": "Task interrupted. Please check the log window for error messages.\n\nDetails: {}"
-            }
-        }
-        self.current_lang = 'zh' # Default language
+    def send(self, from_addr, to_addrs, msg_string):
+        """Send one message over a pooled connection and return sendmail's refused-recipients dict."""
+        self._slots.acquire()
+        try:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = self._connect()
+
+            try:
+                try:
+                    response = session.server.sendmail(from_addr, to_addrs, msg_string)
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    # 服务器关闭了空闲连接，重新连接后重发一次
+                    self.log("SMTP connection was closed by the server, reconnecting...")
+                    self._quit(session)
+                    # 重连本身失败（登录被拒、4xx 问候等）时没有连接可以放回池中
+                    session = None
+                    session = self._connect()
+                    response = session.server.sendmail(from_addr, to_addrs, msg_string)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # SMTPException 是 OSError 的子类，须先于下面的分支处理。
+                # 收件人被拒、数据被拒等应答不影响连接本身（smtplib 已发送 RSET），连接放回池中继续使用；
+                # 421 表示服务器正在关闭连接
+                if session is None:
+                    pass
+                elif getattr(e, 'smtp_code', None) == 421:
+                    self._quit(session)
+                else:
+                    self._idle.put(session)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                if session is not None:
+                    self._quit(session)
+                raise
+            except Exception:
+                # 邮件内容编码错误等发生在与服务器交互之前，连接仍可使用
+                if session is not None:
+                    self._idle.put(session)
+                raise
+
+            session.sent += 1
+            if session.sent >= self.max_messages_per_connection:
+                self._quit(session)
+            else:
+                self._idle.put(session)
+            return response
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter. Refills at messages_per_minute and holds at most
+    `capacity` tokens, so short bursts of up to `capacity` messages are allowed.
+    A rate of 0 disables limiting.
+    """
+    def __init__(self, messages_per_minute, capacity=1):
+        self.rate = max(0.0, float(messages_per_minute)) / 60.0
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one token is available and consume it."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            # 在锁外等待，避免阻塞其他发送线程
+            time.sleep(wait)
+
+
+class EmlFileSender:
+    """
+    Drop-in replacement for SMTPSessionPool used by dry runs. Each message is written to a
+    numbered .eml file in `directory` instead of being sent; with no directory the messages
+    are only counted.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.messages, self.bytes = 0, 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send(self, from_addr, to_addrs, msg_string):
+        data = msg_string.encode('utf-8')
+        with self._lock:
+            self.messages += 1
+            self.bytes += len(data)
+            number = self.messages
+        if self.directory:
+            recipient = re.sub(r'[\\/:*?"<>|\s]', '_', to_addrs[0])
+            with open(os.path.join(self.directory, f"{number:04d}_{recipient}.eml"), 'wb') as f:
+                f.write(data)
+        return {}
+
+    def close(self):
+        pass
+
+
+def is_transient_smtp_error(error):
+    """True for temporary send failures worth retrying: 4xx replies and dropped, reset or refused connections."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # 其他SMTP协议错误（如不支持的扩展）重试无用；普通网络错误（超时、连接被重置或拒绝）可以重试
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class RetryScheduler:
+    """
+    Puts messages that failed with a temporary error back on the send queue after a jittered
+    exponential backoff. Waiting happens on one background thread, so the rest of the batch
+    keeps sending in the meantime.
+    """
+    def __init__(self, target_queue, base_delay=SEND_RETRY_BASE_DELAY, max_delay=SEND_RETRY_MAX_DELAY):
+        self.target_queue = target_queue
+        self.base_delay, self.max_delay = float(base_delay), float(max_delay)
+        self._pending = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def delay(self, attempt):
+        # 在退避上限的50%~100%之间随机取值，避免同时失败的邮件同时重试
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def schedule(self, item, attempt):
+        """Re-queue `item` after the backoff for retry number `attempt` (1-based) and return the delay in seconds."""
+        delay = self.delay(attempt)
+        with self._condition:
+            heapq.heappush(self._pending, (time.monotonic() + delay, next(self._order), item))
+            self._condition.notify()
+        return delay
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._pending or self._pending[0][0] > time.monotonic()):
+                    self._condition.wait(self._pending[0][0] - time.monotonic() if self._pending else None)
+                if self._closed:
+                    return
+                item = heapq.heappop(self._pending)[2]
+            self.target_queue.put(item)
+
+    def close(self):
+        """Stop the scheduler; retries that are still waiting are dropped."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class DataPartition:
+    """
+    Partitions a DataFrame by one column in a single pass. Rows are stably sorted by group
+    once, so each group is a contiguous slice that keeps its original row order and index.
+    Groups are kept in first-appearance order and rows with an empty key are dropped,
+    matching `df[column].dropna().unique()` followed by `df[df[column] == value]`.
+    """
+    def __init__(self, df, column):
+        codes, uniques = pd.factorize(df[column])
+        order = np.argsort(codes, kind='stable')
+        # 空值的编码为-1，排序后位于最前面，直接跳过
+        self._sorted = df.iloc[order[np.count_nonzero(codes < 0):]]
+        self._bounds = np.concatenate(([0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))))
+        self.keys = list(uniques)
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key):
+        """Return the rows of one group as a slice of the partitioned frame."""
+        i = self._positions[key]
+        return self._sorted.iloc[self._bounds[i]:self._bounds[i + 1]]
+
+    def items(self):
+        for key in self.keys:
+            yield key, self.get(key)
+
+
+class SourceFileCache:
+    """
+    Keeps parsed source files in memory keyed by (path, mtime, size), so a file is parsed
+    once and reused by later send runs until it changes on disk. Also offers cheap
+    header-only reads for populating the UI.
+    """
+    def __init__(self, max_entries=2):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def read(path, **kwargs):
+        return pd.read_csv(path, **kwargs) if path.endswith('.csv') else pd.read_excel(path, **kwargs)
+
+    def get(self, path):
+        """Return the cached frame for the file's current version on disk, or None."""
+        key = self.file_key(path)
+        with self._lock:
+            return self._entries.get(key)
+
+    def load(self, path):
+        """Return the full parsed file, reading it only if this version is not cached yet."""
+        key = self.file_key(path)
+        with self._lock:
+            df = self._entries.get(key)
+        if df is not None:
+            return df
+
+        df = self.read(path)
+        with self._lock:
+            # 同一路径的旧版本已失效，直接丢弃；超出上限时淘汰最早缓存的文件
+            for stale_key in [k for k in self._entries if k[0] == key[0]]:
+                del self._entries[stale_key]
+            self._entries[key] = df
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        return df
+
+    def read_columns(self, path):
+        """Return the column headers, parsing only the header row unless the file is cached."""
+        df = self.get(path)
+        return list((df if df is not None else self.read(path, nrows=0)).columns)
+
+
+class SendJournal:
+    """
+    Persistent sqlite journal of per-split-value send state, kept in a per-user data folder
+    unless a journal folder is configured. A run is identified by the source and mapping file
+    contents, split column, subject and CC list, so a restart or rerun of the same batch skips
+    values already sent and redoes the rest; changing any of them starts a new run.
+    """
+    FILENAME = "send_journal.sqlite"
+    APP_DIR_NAME = "EmailSender"
+
+    @classmethod
+    def default_dir(cls):
+        # Windows 使用 %LOCALAPPDATA%，其他系统使用 XDG 数据目录
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+        return os.path.join(base, cls.APP_DIR_NAME)
+
+    def __init__(self, path, run_key):
+        self.path = path
+        self.run_key = run_key
+        # 附件线程和发送线程都会写入，共用一个连接并加锁串行化
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS send_journal (run_key TEXT, split_value TEXT, state TEXT, recipient TEXT, "
+            "response TEXT, updated_at TEXT, PRIMARY KEY (run_key, split_value)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def make_run_key(source_file, mapping_file, split_column, subject_prefix, cc_recipients=()):
+        # 按文件内容而非路径或修改时间计算，复制或重新保存同一份数据仍视为同一批次；
+        # 映射文件或抄送人变化后收件人不同，视为新批次
+        digest = hashlib.sha1()
+        for path in (source_file, mapping_file):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digest.update(b"\0")
+        cc = ";".join(sorted(address.lower() for address in cc_recipients))
+        digest.update(f"{split_column}\0{subject_prefix}\0{cc}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def sent_values(self):
+        """Split values (as strings) already sent in this run."""
+        with self._lock:
+            return {row[0] for row in self.conn.execute(
+                "SELECT split_value FROM send_journal WHERE run_key = ? AND state = 'sent'", (self.run_key,)
+            )}
+
+    def record(self, split_value, state, recipient=None, response=None):
+        updated_at = datetime.now().isoformat(timespec='seconds')
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO send_journal VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_key, str(split_value), state, recipient, response, updated_at)
+            )
+
+
+class EmailSenderPipeline:
+    """
+    Headless splitting and sending pipeline shared by the Tk window and the command-line mode.
+    """
+    # 配置文件与命令行共用的默认设置，取值与界面默认值一致
+    DEFAULT_SETTINGS = {
+        "source_file": "", "split_column": "", "mapping_file": "", "save_dir": "",
+        "smtp_server": "smtp.exmail.qq.com", "smtp_port": "465", "sender_email": "", "password": "",
+        "max_messages_per_connection": "50", "sender_workers": "2", "messages_per_minute": "0",
+        "attachment_workers": "2", "send_retries": "3", "archive_attachments": "1", "dry_run": "0",
+        "journal_dir": "", "fresh": "0", "subject_prefix": "", "cc_recipients": "", "english_values": "",
+        "chinese_prefix": "", "chinese_suffix": "", "english_prefix": "", "english_suffix": ""
+    }
+
+    def __init__(self, templates=None):
+        self.templates = templates or {'chinese': ("", ""), 'english': ("", "")}
 
         # --- Internal representation of column names ---
         self.COLUMN_MAP = {}
@@ -137,96 +499,916 @@ class EmailSenderApp(tk.Tk):
             }
         }
 
-        self.use_filename_as_subject_var = tk.BooleanVar(value=False)
+        self.source_cache = SourceFileCache()
+        self.attachment_writer_engine = ATTACHMENT_WRITER_ENGINE
+        self.ATTACHMENT_WRITERS = {'xlsxwriter': self._write_attachment_xlsxwriter, 'openpyxl': self._write_attachment_openpyxl}
 
-        self.setup_ui()
-        self.update_ui_language()
+    @staticmethod
+    def read_config_file(path):
+        """Read a two-column (Key, Value) Excel/CSV configuration file into a dict, skipping empty values."""
+        df = pd.read_csv(path, header=None) if path.endswith('.csv') else pd.read_excel(path, header=None)
+        return pd.Series(df.iloc[:, 1].values, index=df.iloc[:, 0]).dropna().to_dict()
 
-    def setup_ui(self):
-        self.geometry("1200x900")
+    @staticmethod
+    def parse_bool(value):
+        return str(value).strip().lower() in ("1", "true", "yes", "y", "是")
 
-        # --- Main canvas with a scrollbar ---
-        self.canvas = tk.Canvas(self)
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
+    def log(self, message):
+        LOGGER.info(message)
 
-        self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+    def set_progress(self, done, total):
+        pass
 
-        self.canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        self.bind_mousewheel()
+    def _get_column_mappings(self, df_columns):
+        self.log("Starting smart column name mapping...")
+        self.COLUMN_MAP = {}
+        df_columns_lower = {col.lower().strip(): col for col in df_columns}
 
-        # --- Root layout frame (inside the scrollable area) ---
-        root_frame = ttk.Frame(self.scrollable_frame, padding="10")
-        root_frame.pack(fill=tk.BOTH, expand=True)
-        root_frame.columnconfigure(0, weight=1) # Main content column expands
-        root_frame.columnconfigure(1, weight=0) # Sidebar column has fixed width
+        for key, possible_names in self.KEY_COLS.items():
+            found = False
+            for name in possible_names:
+                for lower_col, original_col in df_columns_lower.items():
+                    if name in lower_col:
+                        self.COLUMN_MAP[key] = original_col
+                        self.log(f"  ✓ Mapped successfully: '{key}' -> '{original_col}'")
+                        found = True
+                        break
+                if found:
+                    break
+        
+        for crit_col in self.CRITICAL_COLS:
+            if crit_col not in self.COLUMN_MAP:
+                raise ValueError(f"Critical column missing! The program could not find a column representing '{crit_col}'. Please ensure the file contains a header with one of the keywords: {self.KEY_COLS[crit_col]}")
 
-        self.create_widgets(root_frame)
+        self.log("Smart column name mapping complete.")
+        return self.COLUMN_MAP
 
-    def create_widgets(self, root_frame):
-        # --- Left Column: Main Configuration ---
-        left_column_frame = ttk.Frame(root_frame)
-        left_column_frame.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
+    def preprocess_data(self, df):
+        self.log("Starting data preprocessing and standardization...")
+        df = df.copy() 
 
-        # --- Right Column: Quick Actions ---
-        right_column_frame = ttk.Frame(root_frame)
-        right_column_frame.grid(row=0, column=1, sticky="ns")
+        warning_type_col = self.COLUMN_MAP.get('warning_type')
+        if warning_type_col:
+            self.log(f"Standardizing '{warning_type_col}' column...")
+            df[warning_type_col] = df[warning_type_col].astype(str)
 
-        # --- Language Switcher ---
-        lang_frame = ttk.LabelFrame(right_column_frame, padding="10")
-        self.lang_frame_label = lang_frame
-        lang_frame.pack(fill=tk.X, pady=5)
-        
-        lang_buttons_frame = ttk.Frame(lang_frame)
-        lang_buttons_frame.pack()
-        ttk.Button(lang_buttons_frame, text="中文", command=lambda: self.switch_language('zh'), width=8).pack(side=tk.LEFT, padx=5)
-        ttk.Button(lang_buttons_frame, text="English", command=lambda: self.switch_language('en'), width=8).pack(side=tk.LEFT, padx=5)
-        
-        # --- Config Loader ---
-        config_frame = ttk.LabelFrame(right_column_frame, padding="10")
-        self.config_frame_label = config_frame
-        config_frame.pack(fill=tk.X, pady=5)
-        
-        self.load_config_button = ttk.Button(config_frame, command=self.load_configuration_file)
-        self.load_config_button.pack(pady=10, fill=tk.X, ipady=4)
+            def standardize_warning_type(value):
+                value = str(value).strip()
+                if re.search('[\u4e00-\u9fff]', value):
+                    if "严厉" in value: return "严厉警告"
+                    elif "口述" in value: return "口述警告"
+                    return value 
+                else:
+                    if "stern" in value.lower(): return "Stern Reminder"
+                    elif "verbal" in value.lower(): return "Verbal Warning"
+                    return value
+            
+            df[warning_type_col] = df[warning_type_col].apply(standardize_warning_type)
+            self.log("  - 'Warning Type' field values unified based on original language (CN/EN).")
 
-        # --- 1. Sender Settings ---
-        self.sender_frame = ttk.LabelFrame(left_column_frame, padding="10")
-        self.sender_frame.pack(fill=tk.X, pady=5)
-        
-        self.smtp_server_label = ttk.Label(self.sender_frame)
-        self.smtp_server_label.grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        self.smtp_server_var = tk.StringVar(value="smtp.exmail.qq.com")
-        ttk.Entry(self.sender_frame, textvariable=self.smtp_server_var, width=30).grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+        sending_status_col = self.COLUMN_MAP.get('sending_status')
+        if sending_status_col:
+            self.log(f"Standardizing '{sending_status_col}' column...")
+            df[sending_status_col] = df[sending_status_col].astype(str)
+            df.loc[df[sending_status_col].str.contains("待发送", na=False), sending_status_col] = "已发送"
+            df.loc[df[sending_status_col].str.contains("Pending", na=False, case=False), sending_status_col] = "Has been sent"
+            self.log("  - 'Sending Status' field values unified based on keywords.")
 
-        self.smtp_port_label = ttk.Label(self.sender_frame)
-        self.smtp_port_label.grid(row=1, column=2, padx=5, pady=5, sticky="w")
-        self.smtp_port_var = tk.StringVar(value="465")
-        ttk.Entry(self.sender_frame, textvariable=self.smtp_port_var, width=10).grid(row=1, column=3, padx=5, pady=5)
+        self.log("Data preprocessing and standardization complete.")
+        return df
 
-        self.sender_email_label = ttk.Label(self.sender_frame)
-        self.sender_email_label.grid(row=2, column=0, padx=5, pady=5, sticky="w")
-        self.sender_email_var = tk.StringVar()
-        ttk.Entry(self.sender_frame, textvariable=self.sender_email_var, width=30).grid(row=2, column=1, padx=5, pady=5, sticky="ew")
+    def is_english_processing_required(self, area_name):
+        return str(area_name).strip() in self.english_processing_values
 
-        self.password_label = ttk.Label(self.sender_frame)
-        self.password_label.grid(row=2, column=2, padx=5, pady=5, sticky="w")
-        self.password_var = tk.StringVar()
-        ttk.Entry(self.sender_frame, textvariable=self.password_var, show="*", width=20).grid(row=2, column=3, padx=5, pady=5, sticky="ew")
-        
-        # --- 2. Data and File Selection ---
-        self.data_frame = ttk.LabelFrame(left_column_frame, padding="10")
-        self.data_frame.pack(fill=tk.X, pady=5)
-        self.data_frame.columnconfigure(1, weight=1)
+    def generate_sheet_names(self, is_english=False):
+        return self.SHEET_NAMES['english' if is_english else 'chinese']
 
-        self.source_file_label = ttk.Label(self.data_frame)
-        self.source_file_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        self.source_file_var = tk.StringVar()
-        ttk.Entry(self.data_frame, textvariable=self.source_file_var).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
-        self.browse_button1 = ttk.Button(self.data_frame, command=self.select_source_file)
+    WARNING_COUNT_COLUMNS = ["Stern Reminder", "Verbal Warning"]
+
+    def count_warnings_per_employee(self, df):
+        """Return a DataFrame indexed by employee ID with integer 'Stern Reminder' and 'Verbal Warning' counts."""
+        id_col, warning_type_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('warning_type')
+        if not id_col or not warning_type_col:
+            self.log("Error: Cannot count warnings as employee ID or warning type column is not mapped.")
+            return pd.DataFrame(columns=self.WARNING_COUNT_COLUMNS, dtype="int64")
+
+        mapping_for_stats = {"严厉警告": "Stern Reminder", "口述警告": "Verbal Warning"}
+        temp_warning_types = df[warning_type_col].replace(mapping_for_stats)
+        
+        warning_counts_df = df.groupby([id_col, temp_warning_types]).size().unstack(fill_value=0)
+        # 只保留两种警告列，没有警告记录的员工计为0
+        return warning_counts_df.reindex(index=df[id_col].unique(), columns=self.WARNING_COUNT_COLUMNS, fill_value=0)
+
+    def join_warning_counts(self, df, all_employees_warning_counts):
+        """Look up the global warning counts for each row of df by employee ID, aligned to df's index."""
+        counts = all_employees_warning_counts.reindex(df[self.COLUMN_MAP.get('id')].to_numpy(), fill_value=0)
+        counts.index = df.index
+        return counts
+
+    def compute_split_statistics(self, df_split, all_employees_warning_counts, is_english=False):
+        """
+        Classify the split's employees by global stern-reminder count once and return the numbers
+        behind both the analysis sheets and the email summary:
+        - 'employees' / 'employee_counts': first row of each employee in the split and its aligned warning counts.
+        - '2x_count', '3x_plus_count' and their '*_status_breakdown' dicts for the whole split.
+        - 'branch_risk': {branch: {'total', '2x_count', '3x_plus_count', '2x_status_breakdown', '3x_plus_status_breakdown'}}
+          for branches with at least one 2x/3x+ employee, in order of first appearance.
+        Status breakdowns are ordered by first appearance, matching the original row-by-row counting.
+        """
+        id_col, branch_col, status_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('branch'), self.COLUMN_MAP.get('status')
+        unknown_status = "未知" if not is_english else "Unknown"
+
+        def classify(frame):
+            # 风险等级：满2次为'2x'，3次及以上为'3x_plus'，其余为空
+            stern_counts = self.join_warning_counts(frame, all_employees_warning_counts)["Stern Reminder"].to_numpy()
+            levels = np.select([stern_counts == 2, stern_counts >= 3], ['2x', '3x_plus'], default='')
+            statuses = frame[status_col].to_numpy() if status_col in frame.columns else np.full(len(frame), unknown_status, dtype=object)
+            return pd.DataFrame({'level': levels, 'status': statuses}, index=frame.index)
+
+        def breakdowns(counts):
+            # counts: 以 (level, status) 为索引的人数，按首次出现顺序整理为字典
+            result = {'2x_status_breakdown': {}, '3x_plus_status_breakdown': {}}
+            for (level, status), count in counts.items():
+                result[f'{level}_status_breakdown'][status] = int(count)
+            return result
+
+        employees = df_split.drop_duplicates(subset=[id_col])
+        employee_levels = classify(employees)
+        risky = employee_levels[employee_levels['level'] != '']
+        stats = breakdowns(risky.groupby(['level', 'status'], sort=False, dropna=False).size())
+        stats.update({
+            'employees': employees,
+            'employee_counts': self.join_warning_counts(employees, all_employees_warning_counts),
+            '2x_count': int((employee_levels['level'] == '2x').sum()),
+            '3x_plus_count': int((employee_levels['level'] == '3x_plus').sum()),
+            'branch_risk': {}
+        })
+
+        if branch_col:
+            # 同一员工在每个网点各计一次，状态取其在该网点的首行
+            branch_employees = df_split[df_split[branch_col].notna()].drop_duplicates(subset=[branch_col, id_col])
+            branch_levels = classify(branch_employees)
+            branch_levels['branch'] = branch_employees[branch_col]
+            risky = branch_levels[branch_levels['level'] != '']
+            per_branch = risky.groupby(['branch', 'level', 'status'], sort=False, dropna=False).size()
+            branch_details = {}
+            for branch, counts in per_branch.groupby(level=0, sort=False):
+                details = breakdowns(counts.droplevel(0))
+                details['2x_count'] = sum(details['2x_status_breakdown'].values())
+                details['3x_plus_count'] = sum(details['3x_plus_status_breakdown'].values())
+                details['total'] = details['2x_count'] + details['3x_plus_count']
+                branch_details[branch] = details
+            # 网点按其在拆分数据中的首次出现顺序排列
+            stats['branch_risk'] = {branch: branch_details[branch] for branch in branch_employees[branch_col].unique() if branch in branch_details}
+        return stats
+
+    def generate_warning_analysis_sheets(self, df_split, all_employees_warning_counts, is_english=False, stats=None):
+        sheets_data = {}
+        sheet_names = self.generate_sheet_names(is_english)
+        field_mappings = self.FIELD_MAPPINGS['english' if is_english else 'chinese']
+        
+        id_col, branch_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('branch')
+        base_columns_keys = ['area', 'district', 'branch', 'ops', 'position', 'id', 'name', 'status', 'employment_type']
+        available_base_columns = list(dict.fromkeys(self.COLUMN_MAP[key] for key in base_columns_keys if key in self.COLUMN_MAP))
+        stern_col, verbal_col = ("Stern Reminder", "Verbal Warning") if is_english else ("严厉警告 Stern Reminder", "口述警告 Verbal Warning")
+        
+        if stats is None: stats = self.compute_split_statistics(df_split, all_employees_warning_counts, is_english)
+        # 每名员工取拆分数据中的首行及其全局警告次数
+        unique_employees_in_split, employee_counts = stats['employees'], stats['employee_counts']
+        employee_rows = unique_employees_in_split[available_base_columns].assign(
+            **{stern_col: employee_counts["Stern Reminder"], verbal_col: employee_counts["Verbal Warning"]}
+        ).reset_index(drop=True)
+        stern_counts = employee_rows[stern_col]
+
+        two_stern_employees = employee_rows[stern_counts == 2]
+        if not two_stern_employees.empty:
+            df_2x = two_stern_employees.reset_index(drop=True).infer_objects().sort_values(stern_col, ascending=False)
+            sheets_data[sheet_names["2x_stern"]] = df_2x
+            self.log(f"Analysis generated '{sheet_names['2x_stern']}': {len(two_stern_employees)} employees")
+        
+        three_plus_stern_employees = employee_rows[stern_counts >= 3]
+        if not three_plus_stern_employees.empty:
+            df_3x = three_plus_stern_employees.reset_index(drop=True).infer_objects().sort_values(stern_col, ascending=False)
+            sheets_data[sheet_names["3x_stern"]] = df_3x
+            self.log(f"Analysis generated '{sheet_names['3x_stern']}': {len(three_plus_stern_employees)} employees")
+        
+        if branch_col:
+            branch_risk_counts = pd.DataFrame.from_dict(stats['branch_risk'], orient='index', columns=['2x_count', '3x_plus_count']).rename(columns={
+                '2x_count': field_mappings["满2次严厉警告员工人数"], '3x_plus_count': field_mappings["超3次及以上严厉警告员工人数"]
+            })
+            
+            if not branch_risk_counts.empty:
+                # 网点的大区、片区、部门取该网点在拆分数据中的首行
+                branch_info = df_split.drop_duplicates(subset=[branch_col]).set_index(branch_col).reindex(branch_risk_counts.index)
+                branch_risk_df = pd.DataFrame({
+                    self.COLUMN_MAP.get('area', 'Area'): branch_info[self.COLUMN_MAP['area']].to_numpy() if 'area' in self.COLUMN_MAP else None,
+                    self.COLUMN_MAP.get('district', 'District'): branch_info[self.COLUMN_MAP['district']].to_numpy() if 'district' in self.COLUMN_MAP else None,
+                    branch_col: branch_risk_counts.index.to_numpy(),
+                    self.COLUMN_MAP.get('ops', 'OPS'): branch_info[self.COLUMN_MAP['ops']].to_numpy() if 'ops' in self.COLUMN_MAP else None,
+                    **{col: branch_risk_counts[col].to_numpy() for col in branch_risk_counts.columns}
+                }).infer_objects()
+                branch_risk_df["_total_risk"] = branch_risk_df[field_mappings["满2次严厉警告员工人数"]].fillna(0) + branch_risk_df[field_mappings["超3次及以上严厉警告员工人数"]].fillna(0)
+                branch_risk_df = branch_risk_df.sort_values("_total_risk", ascending=False).drop("_total_risk", axis=1)
+                sheets_data[sheet_names["branch_risk"]] = branch_risk_df
+                self.log(f"Analysis generated '{sheet_names['branch_risk']}': {len(branch_risk_df)} branches")
+        
+        return sheets_data
+
+    def generate_statistics_summary(self, df_split, all_employees_warning_counts, is_english=False, stats=None):
+        if stats is None: stats = self.compute_split_statistics(df_split, all_employees_warning_counts, is_english)
+        count_2x_total, count_3x_plus_total = stats['2x_count'], stats['3x_plus_count']
+        status_2x_count, status_3x_plus_count = stats['2x_status_breakdown'], stats['3x_plus_status_breakdown']
+        branch_risk_details = stats['branch_risk']
+        
+        top_5_branches = sorted(branch_risk_details.items(), key=lambda x: x[1]['total'], reverse=True)[:5]
+        
+        if is_english:
+            return f"""=== WARNING STATISTICS SUMMARY ===
+
+Total Employees Analysis:
+- Employees with exactly 2 Stern Reminders: {count_2x_total}
+- Employees with 3+ Stern Reminders: {count_3x_plus_total}
+
+Work Status Distribution (2 Stern Reminders):
+{self._format_status_breakdown(status_2x_count, is_english)}
+
+Work Status Distribution (3+ Stern Reminders):
+{self._format_status_breakdown(status_3x_plus_count, is_english)}
+
+Branches Involved: {len(branch_risk_details)}
+
+Top 5 High-Risk Branches:
+{self._format_top_branches_detailed(top_5_branches, is_english)}
+===============================""".strip()
+        else:
+            return f"""=== 警告统计总结 ===
+
+员工总体分析:
+- 累计2次严厉警告员工: {count_2x_total}人
+- 累计3次及以上严厉警告员工: {count_3x_plus_total}人
+
+在职状态分布 (2次严厉警告):
+{self._format_status_breakdown(status_2x_count, is_english)}
+
+在职状态分布 (3次及以上严厉警告):
+{self._format_status_breakdown(status_3x_plus_count, is_english)}
+
+涉及网点数量: {len(branch_risk_details)}个
+
+高风险网点排名前5:
+{self._format_top_branches_detailed(top_5_branches, is_english)}
+====================""".strip()
+
+    def _format_status_breakdown(self, status_count, is_english=False):
+        if not status_count: return "- 无数据" if not is_english else "- No data"
+        return "\n".join([f"- {status}: {count}{'人' if not is_english else ''}" for status, count in status_count.items()])
+
+    def _format_status_breakdown_inline(self, breakdown_dict, is_english=False):
+        if not breakdown_dict: return ""
+        items = [f"{status}: {count}{'人' if not is_english else ''}" for status, count in breakdown_dict.items()]
+        return ", ".join(items)
+
+    def _format_top_branches_detailed(self, top_branches, is_english=False):
+        if not top_branches: return "- 无数据" if not is_english else "- No data"
+        result = []
+        for i, (branch, details) in enumerate(top_branches, 1):
+            if is_english:
+                branch_str = f"{i}. {branch} - Total Risk: {details['total']}"
+                if details['3x_plus_count'] > 0:
+                    branch_str += f"\n   - Employees with 3+ Stern Reminders: {details['3x_plus_count']}; Status: {self._format_status_breakdown_inline(details['3x_plus_status_breakdown'], is_english)}"
+                if details['2x_count'] > 0:
+                    branch_str += f"\n   - Employees with 2 Stern Reminders: {details['2x_count']}; Status: {self._format_status_breakdown_inline(details['2x_status_breakdown'], is_english)}"
+            else:
+                branch_str = f"{i}. {branch} - 总风险人数: {details['total']}人"
+                if details['3x_plus_count'] > 0:
+                    branch_str += f"\n   - 累计3次及以上严厉警告员工: {details['3x_plus_count']}人；状态: {self._format_status_breakdown_inline(details['3x_plus_status_breakdown'], is_english)}"
+                if details['2x_count'] > 0:
+                    branch_str += f"\n   - 累计2次严厉警告员工: {details['2x_count']}人；状态: {self._format_status_breakdown_inline(details['2x_status_breakdown'], is_english)}"
+            result.append(branch_str)
+        return "\n".join(result)
+    
+    def create_multi_sheet_excel(self, df_split, file_path, area_name, all_employees_warning_counts, stats=None):
+        """Write the attachment workbook to file_path, which may also be a binary buffer such as io.BytesIO."""
+        is_english = self.is_english_processing_required(area_name)
+        sheet_names = self.generate_sheet_names(is_english)
+        analysis_sheets = self.generate_warning_analysis_sheets(df_split, all_employees_warning_counts, is_english, stats)
+        
+        ordered_sheets = []
+        if sheet_names["branch_risk"] in analysis_sheets: ordered_sheets.append((sheet_names["branch_risk"], analysis_sheets[sheet_names["branch_risk"]]))
+        for sheet_key in ["3x_stern", "2x_stern"]:
+            if sheet_names[sheet_key] in analysis_sheets: ordered_sheets.append((sheet_names[sheet_key], analysis_sheets[sheet_names[sheet_key]]))
+        ordered_sheets.append((sheet_names["details"], df_split))
+        
+        # 分析表中的统计列为0时留空，在写入单元格时处理，不再复制整张表
+        stat_cols_to_clear = {
+            "严厉警告 Stern Reminder", "口述警告 Verbal Warning", "Stern Reminder", "Verbal Warning",
+            self.FIELD_MAPPINGS['chinese']["满2次严厉警告员工人数"], self.FIELD_MAPPINGS['english']["满2次严厉警告员工人数"],
+            self.FIELD_MAPPINGS['chinese']["超3次及以上严厉警告员工人数"], self.FIELD_MAPPINGS['english']["超3次及以上严厉警告员工人数"]
+        }
+        sheets = [
+            (sheet_name, sheet_df, set() if sheet_name == sheet_names["details"] else stat_cols_to_clear.intersection(sheet_df.columns))
+            for sheet_name, sheet_df in ordered_sheets
+        ]
+        self.ATTACHMENT_WRITERS[self.attachment_writer_engine](file_path, sheets)
+        target_name = os.path.basename(file_path) if isinstance(file_path, str) else f"[{area_name}] in-memory attachment"
+        self.log(f"Multi-sheet Excel file generated: {target_name} ({'English Mode' if is_english else 'Chinese Mode'})")
+
+    def _write_attachment_xlsxwriter(self, target, sheets):
+        """
+        Write (sheet_name, df, blank_zero_columns) sheets with xlsxwriter, row by row. Attachments larger than
+        ATTACHMENT_CONSTANT_MEMORY_ROWS use constant_memory mode; smaller ones are built entirely in memory.
+        Zeros in blank_zero_columns are left as empty cells; other cell output matches DataFrame.to_excel.
+        """
+        total_rows = sum(len(df) for _, df, _ in sheets)
+        memory_mode = {'constant_memory': True} if total_rows > ATTACHMENT_CONSTANT_MEMORY_ROWS else {'in_memory': True}
+        workbook = xlsxwriter.Workbook(target, {**memory_mode, 'strings_to_urls': False})
+        try:
+            # 表头及日期样式与 pandas to_excel 一致
+            header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+            datetime_format = workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'})
+            date_format = workbook.add_format({'num_format': 'YYYY-MM-DD'})
+
+            for sheet_name, df, blank_zero_columns in sheets:
+                worksheet = workbook.add_worksheet(sheet_name)
+                for col_idx, col in enumerate(df.columns):
+                    worksheet.write(0, col_idx, col, header_format)
+
+                columns = [self._native_cell_values(df.iloc[:, col_idx]) for col_idx in range(df.shape[1])]
+                blank_zero = [col in blank_zero_columns for col in df.columns]
+                for row_idx, row in enumerate(zip(*columns), start=1):
+                    for col_idx, value in enumerate(row):
+                        if value is None or (blank_zero[col_idx] and self._is_zero(value)):
+                            continue
+                        if isinstance(value, datetime):
+                            worksheet.write_datetime(row_idx, col_idx, value, datetime_format)
+                        elif isinstance(value, date):
+                            worksheet.write_datetime(row_idx, col_idx, value, date_format)
+                        else:
+                            worksheet.write(row_idx, col_idx, value)
+        finally:
+            workbook.close()
+
+    def _write_attachment_openpyxl(self, target, sheets):
+        """Fallback writer: DataFrame.to_excel via openpyxl, then clear zero cells of blank_zero_columns in place."""
+        with pd.ExcelWriter(target, engine='openpyxl') as writer:
+            for sheet_name, df, blank_zero_columns in sheets:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                worksheet = writer.sheets[sheet_name]
+                for col_idx, col in enumerate(df.columns, start=1):
+                    if col not in blank_zero_columns: continue
+                    for (cell,) in worksheet.iter_rows(min_row=2, max_row=len(df) + 1, min_col=col_idx, max_col=col_idx):
+                        if self._is_zero(cell.value): cell.value = None
+
+    def _native_cell_values(self, series):
+        # 空值写为空白单元格，正负无穷与 to_excel 一样写为 "inf"/"-inf"
+        values = series.astype(object).where(series.notna(), None).tolist()
+        if series.dtype.kind == 'f' or series.dtype == object:
+            values = [("inf" if v > 0 else "-inf") if isinstance(v, float) and np.isinf(v) else v for v in values]
+        return values
+
+    @staticmethod
+    def _is_zero(value):
+        return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)) and value == 0
+
+    def archive_attachment(self, file_path, attachment_bytes):
+        with open(file_path, "wb") as f:
+            f.write(attachment_bytes)
+
+    def read_email_templates(self):
+        """Return the (prefix, suffix) body templates for both languages."""
+        return self.templates
+
+    def generate_email_content(self, area_name, df_split, all_employees_warning_counts, templates=None, stats=None):
+        is_english = self.is_english_processing_required(area_name)
+        
+        # 工作线程中传入预先读取的模板，避免跨线程读取Text控件
+        prefix, suffix = (templates or self.read_email_templates())['english' if is_english else 'chinese']
+        summary = self.generate_statistics_summary(df_split, all_employees_warning_counts, is_english, stats)
+        
+        return f"{prefix}\n\n{summary}\n\n{suffix}".strip()
+
+    def write_failure_report(self, problems, split_values, report_dir, subject_prefix):
+        """Write the values that were not sent (stage, error type, attempts, last error) to an Excel report."""
+        order = {value: i for i, value in enumerate(split_values)}
+        columns = ["Split Value", "Recipient", "Status", "Stage", "Attempts", "Error"]
+        report = pd.DataFrame(sorted(problems, key=lambda row: order.get(row[0], len(order))), columns=columns)
+        report_path = os.path.join(report_dir, f"{subject_prefix}_failed_recipients_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+        report.to_excel(report_path, index=False)
+        return report_path
+
+    def send_batch(self, params, templates):
+        """
+        Validate the settings, then split the source file and send (or dry-run) one email per
+        split value. Returns the sent/skipped/failed counts.
+        """
+        for field in ["source_file", "split_column", "mapping_file", "save_dir", "smtp_server", "smtp_port", "sender_email", "password", "subject_prefix"]:
+            if field == "save_dir" and not params["archive_attachments"]: continue
+            # 演练模式不连接邮件服务器，服务器与授权码可以留空
+            if field in ("smtp_server", "smtp_port", "password") and params["dry_run"]: continue
+            if not params[field]:
+                if field == "subject_prefix": raise ValueError("Email subject prefix cannot be empty! Please fill it or check the 'use filename' option.")
+                raise ValueError(f"Required field '{field}' is empty! Please check your configuration.")
+            
+        for field, label, minimum in [("max_messages_per_connection", "Max emails per connection", 1), ("sender_workers", "Sender workers", 1),
+                                      ("attachment_workers", "Attachment workers", 1), ("messages_per_minute", "Max emails per minute", 0),
+                                      ("send_retries", "Retries on temporary failure", 0)]:
+            # 留空时使用 DEFAULT_SETTINGS 中的默认值
+            value = str(params[field]).strip() or self.DEFAULT_SETTINGS[field]
+            if not value.isdigit() or int(value) < minimum:
+                raise ValueError(f"{label} must be an integer >= {minimum}.")
+            params[field] = int(value)
+
+        (cn_prefix, cn_suffix), (en_prefix, en_suffix) = templates['chinese'], templates['english']
+        if not (cn_prefix or cn_suffix) and not (en_prefix or en_suffix):
+            raise ValueError("At least one email template (Chinese or English prefix/suffix) must be filled.")
+            
+        self.log("Parameter validation passed.")
+        if params["dry_run"]:
+            self.log("Dry run: no email will be sent and the SMTP server will not be contacted.")
+        metrics = RunMetrics(
+            "email_sender", source_file=params["source_file"], split_column=params["split_column"], dry_run=params["dry_run"],
+            attachment_workers=params["attachment_workers"], sender_workers=params["sender_workers"], writer_engine=self.attachment_writer_engine
+        )
+        run_started = time.perf_counter()
+
+        if self.source_cache.get(params["source_file"]) is not None:
+            self.log("Reusing source data loaded earlier (file unchanged on disk).")
+        else:
+            self.log("Reading source data file...")
+        with metrics.stage("read source"):
+            df_source = self.source_cache.load(params["source_file"])
+        self.log(f"Source data file contains {len(df_source)} rows.")
+        metrics.count("source rows", len(df_source))
+            
+        self._get_column_mappings(df_source.columns)
+        with metrics.stage("preprocess"):
+            df_source_preprocessed = self.preprocess_data(df_source)
+            
+        self.log("Performing global count of warnings for all employees...")
+        with metrics.stage("count warnings"):
+            all_employees_warning_counts = self.count_warnings_per_employee(df_source_preprocessed)
+        self.log(f"Global count complete. Analyzed {len(all_employees_warning_counts)} unique employees.")
+            
+        self.log("Reading email mapping file...")
+        with metrics.stage("read mapping"):
+            df_mapping = pd.read_excel(params["mapping_file"])
+            mapping_dict = pd.Series(df_mapping.iloc[:, 1].values, index=df_mapping.iloc[:, 0]).to_dict()
+        self.log("Email mapping loaded successfully.")
+
+        # 按拆分字段一次性分区，每个拆分值直接取连续切片，无需逐个全表过滤
+        with metrics.stage("partition"):
+            partition = DataPartition(df_source_preprocessed, params["split_column"])
+        split_values = partition.keys
+        self.log(f"Detected {len(split_values)} unique split values to process.")
+
+        # 发送日志记录每个拆分值的状态；中断后重新运行只处理尚未发送成功的拆分值。
+        # 日志默认放在用户数据目录，不写入保存目录；无法创建时仅失去续传能力，照常发送
+        journal = None
+        if params["dry_run"]:
+            self.log("Dry run: send journal not used, all split values are rendered.")
+        else:
+            journal_dir = params.get("journal_dir") or SendJournal.default_dir()
+            journal_path = os.path.join(journal_dir, SendJournal.FILENAME)
+            try:
+                os.makedirs(journal_dir, exist_ok=True)
+                journal = SendJournal(journal_path, SendJournal.make_run_key(
+                    params["source_file"], params["mapping_file"], params["split_column"], params["subject_prefix"], params["cc_recipients"]
+                ))
+                already_sent = journal.sent_values()
+            except (OSError, sqlite3.Error) as e:
+                if journal is not None:
+                    journal.close()
+                    journal = None
+                self.log(f"Warning: could not open the send journal at {journal_path} ({e}). Continuing without it: an interrupted run cannot be resumed.")
+            else:
+                if already_sent and params.get("fresh"):
+                    # 重新发送全部：忽略日志中已发送的记录，本次结果覆盖旧记录
+                    self.log(f"Resend all: ignoring {len(already_sent)} value(s) the send journal marks as sent.")
+                elif already_sent:
+                    split_values = [value for value in split_values if str(value) not in already_sent]
+                    self.log(f"Resuming from send journal: {len(partition) - len(split_values)} value(s) already sent in an earlier run will be skipped.")
+                self.log(f"Send journal: {journal_path}")
+        total_tasks = len(split_values)
+        self.set_progress(0, total_tasks)
+        metrics.count("split values", len(partition))
+        metrics.count("already sent", len(partition) - total_tasks)
+
+        cc_info = f"CC: {';'.join(params['cc_recipients'])}" if params["cc_recipients"] else "No CC"
+        # 待发送队列有上限，附件生成过快时阻塞，控制内存中的邮件数量
+        ready_queue = queue.Queue(maxsize=params["sender_workers"] * 2)
+        outcome_queue = queue.Queue()
+        rate_limiter = TokenBucket(0 if params["dry_run"] else params["messages_per_minute"], capacity=params["sender_workers"])
+        if params["messages_per_minute"] and not params["dry_run"]:
+            self.log(f"Rate limit: {params['messages_per_minute']} emails/minute.")
+        self.log(f"Using {params['attachment_workers']} attachment worker(s) and {params['sender_workers']} sender worker(s).")
+
+        def record(value, state, recipient=None, response=None):
+            # 日志写入失败（数据库被锁、磁盘已满等）只影响续传，不能让工作线程退出而不报告结果
+            if journal is not None:
+                try:
+                    journal.record(value, state, recipient, response)
+                except Exception as e:
+                    self.log(f"[{value}] Warning: could not record '{state}' in the send journal ({e}). A resumed run may process this value again.")
+
+        def build_message(value):
+            # 附件线程：拆分数据、生成附件并组装邮件，然后放入待发送队列
+            try:
+                with metrics.stage("split"):
+                    df_split = partition.get(value)
+                is_english_processing = self.is_english_processing_required(value)
+                processing_mode = "English Mode" if is_english_processing else "Chinese Mode"
+                self.log(f"[{value}] Split data contains {len(df_split)} rows. Processing mode: {processing_mode}")
+                # 统计只计算一次，附件分析表与邮件正文共用
+                with metrics.stage("statistics"):
+                    stats = self.compute_split_statistics(df_split, all_employees_warning_counts, is_english_processing)
+
+                # 附件在内存中生成，存档写盘交给后台线程，不再写入后重新读取
+                attachment_filename = f"{params['subject_prefix']}_{value}.xlsx"
+                buffer = io.BytesIO()
+                with metrics.stage("attachment"):
+                    self.create_multi_sheet_excel(df_split, buffer, value, all_employees_warning_counts, stats)
+                attachment_bytes = buffer.getvalue()
+                metrics.count("attachment bytes", len(attachment_bytes))
+                record(value, "built")
+                if params["archive_attachments"]:
+                    archive_jobs.append((attachment_filename, archiver.submit(self.archive_attachment, os.path.join(params["save_dir"], attachment_filename), attachment_bytes)))
+
+                recipient_email = mapping_dict.get(value)
+                if not recipient_email:
+                    record(value, "skipped", response="No email in mapping file")
+                    problems.append((value, None, "skipped", "mapping", 0, "No email found in the mapping file"))
+                    outcome_queue.put((value, "skipped", f"Warning: No email found for '{value}' in the mapping file. Skipping this item."))
+                    return
+
+                with metrics.stage("email body"):
+                    email_body = self.generate_email_content(value, df_split, all_employees_warning_counts, templates, stats)
+                with metrics.stage("mime"):
+                    msg = MIMEMultipart()
+                    msg['From'], msg['To'], msg['Subject'] = params["sender_email"], recipient_email, f"{params['subject_prefix']}_{value}"
+                    if params["cc_recipients"]: msg['Cc'] = ";".join(params["cc_recipients"])
+                    msg.attach(MIMEText(email_body, 'plain', 'utf-8'))
+
+                    part = MIMEApplication(attachment_bytes, Name=attachment_filename)
+                    part['Content-Disposition'] = f'attachment; filename="{attachment_filename}"'
+                    msg.attach(part)
+                    msg_string = msg.as_string()
+                metrics.count("message bytes", len(msg_string))
+                record(value, "queued", recipient_email)
+                ready_queue.put((value, recipient_email, [recipient_email] + params["cc_recipients"], msg_string, processing_mode, 1))
+            except Exception as build_error:
+                record(value, "failed", response=f"Error preparing email: {build_error}")
+                problems.append((value, None, "failed", "build", 0, str(build_error)))
+                outcome_queue.put((value, "failed", f"Error preparing email: {build_error}"))
+
+        def send_messages(smtp_pool):
+            # 发送线程：从队列取出邮件，经限速后通过连接池发送
+            while True:
+                item = ready_queue.get()
+                if item is None:
+                    break
+                value, recipient_email, all_recipients, msg_string, processing_mode, attempt = item
+                with metrics.stage("rate limit wait"):
+                    rate_limiter.acquire()
+                try:
+                    with metrics.stage(send_stage):
+                        refused = smtp_pool.send(params["sender_email"], all_recipients, msg_string)
+                except Exception as email_error:
+                    transient = is_transient_smtp_error(email_error)
+                    if transient and attempt <= params["send_retries"]:
+                        # 临时错误：退避后重新放回队列，其余邮件继续发送
+                        delay = retry_scheduler.schedule(item[:-1] + (attempt + 1,), attempt)
+                        metrics.count("retries")
+                        record(value, "retrying", recipient_email, str(email_error))
+                        self.log(f"[{value}] Temporary sending failure ({email_error}). Retry {attempt}/{params['send_retries']} in {delay:.1f}s.")
+                        continue
+                    error_type = "temporary" if transient else "permanent"
+                    record(value, "failed", recipient_email, str(email_error))
+                    problems.append((value, recipient_email, "failed", f"send ({error_type})", attempt, str(email_error)))
+                    outcome_queue.put((value, "failed", f"Email sending failed ({error_type} error, {attempt} attempt(s)): {email_error}"))
+                    continue
+                # 只有 send 本身的异常算作发送失败；服务器已接收邮件，记录被拒收的抄送地址（如有）
+                record(value, "sent", recipient_email, json.dumps({address: f"{code} {reply.decode('utf-8', 'replace')}" for address, (code, reply) in refused.items()}, ensure_ascii=False))
+                outcome_queue.put((value, "sent", f"{sent_message} {recipient_email} ({cc_info}) - Mode: {processing_mode}"))
+
+        outcomes = {"sent": 0, "skipped": 0, "failed": 0}
+        archive_jobs = []
+        problems = []
+        if params["dry_run"]:
+            # 演练模式用 .eml 文件代替SMTP发送，其余环节与正式发送完全相同
+            eml_dir = os.path.join(params["save_dir"], f"dry_run_{datetime.now().strftime('%Y%m%d_%H%M%S')}") if params["save_dir"] else None
+            transport, send_stage = EmlFileSender(eml_dir), "write .eml"
+            # 演练模式的日志不能写成“已发送”，避免定时任务日志误报
+            sent_message = "Dry run, wrote .eml for:" if eml_dir else "Dry run, rendered (not sent) email for:"
+        else:
+            # 整个批次复用已登录的SMTP连接，每个发送线程最多占用一个连接
+            transport, send_stage = SMTPSessionPool(
+                params["smtp_server"], params["smtp_port"], params["sender_email"], params["password"],
+                max_messages_per_connection=params["max_messages_per_connection"], max_connections=params["sender_workers"], log=self.log
+            ), "send"
+            sent_message = "Email sent successfully to:"
+        with transport as smtp_pool:
+            retry_scheduler = RetryScheduler(ready_queue)
+            senders = [threading.Thread(target=send_messages, args=(smtp_pool,), daemon=True) for _ in range(params["sender_workers"])]
+            for sender in senders:
+                sender.start()
+            try:
+                with ThreadPoolExecutor(max_workers=1) as archiver, ThreadPoolExecutor(max_workers=params["attachment_workers"]) as builders:
+                    for value in split_values:
+                        builders.submit(build_message, value)
+
+                    # 每个拆分值恰好产生一条结果，按完成顺序更新进度条
+                    for done in range(1, total_tasks + 1):
+                        value, status, message = outcome_queue.get()
+                        outcomes[status] += 1
+                        metrics.count(status)
+                        self.log(f"[{value}] {message}")
+                        self.set_progress(done, total_tasks)
+            finally:
+                retry_scheduler.close()
+                for _ in senders:
+                    ready_queue.put(None)
+                for sender in senders:
+                    sender.join()
+                if journal is not None:
+                    journal.close()
+
+        elapsed = time.perf_counter() - run_started
+        self.log(f"{'Rendered (dry run)' if params['dry_run'] else 'Sent'}: {outcomes['sent']}, skipped: {outcomes['skipped']}, failed: {outcomes['failed']}.")
+        if params["dry_run"]:
+            target = f"wrote .eml files to: {eml_dir}" if eml_dir else "no save folder, messages were only counted"
+            self.log(f"Dry run: {transport.messages} message(s), {transport.bytes / 1048576:.1f} MB, {target}")
+        self.log(f"Stage timings (worker stages are summed over threads), total run time {elapsed:.2f}s, "
+                 f"{total_tasks / elapsed if elapsed else 0:.1f} split value(s)/s:")
+        for stage, seconds, calls in metrics.summary():
+            self.log(f"  {stage}: {seconds:.2f}s over {calls} call(s), {seconds / max(calls, 1) * 1000:.1f} ms each")
+        report_dir = params["save_dir"] or os.path.dirname(os.path.abspath(params["source_file"]))
+        if problems:
+            # 未发送成功的拆分值汇总成报告，便于排查后单独重发；
+            # 此时邮件均已发出，报告写入失败只记录警告，不能把本次运行变成致命错误
+            try:
+                report_path = self.write_failure_report(problems, split_values, report_dir, params["subject_prefix"])
+            except Exception as e:
+                self.log(f"Warning: Could not write the failed/skipped recipients report to {report_dir}: {e}")
+            else:
+                self.log(f"Failed/skipped recipients report saved to: {report_path}")
+        if params["archive_attachments"]:
+            archive_errors = [(name, job.exception()) for name, job in archive_jobs if job.exception()]
+            for name, archive_error in archive_errors:
+                self.log(f"Warning: Could not save attachment {name} to the save folder: {archive_error}")
+            self.log(f"Saved {len(archive_jobs) - len(archive_errors)} attachment(s) to: {params['save_dir']}")
+        metrics_path = os.path.join(report_dir, f"{params['subject_prefix']}_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        # 指标文件只是附带的统计，写入失败只记录警告
+        try:
+            metrics.write(metrics_path)
+        except Exception as e:
+            self.log(f"Warning: Could not write the run metrics to {metrics_path}: {e}")
+        else:
+            self.log(f"Run metrics saved to: {metrics_path}")
+        self.log("-" * 60)
+        self.log("All tasks completed!")
+        return outcomes
+
+
+# 无界面模式下没有导入 tkinter，界面类只保留定义，不会被实例化
+class EmailSenderApp(EmailSenderPipeline):
+    """
+    An automated tool for batch sending emails, specifically for processing historical warning letters.
+    """
+    def __init__(self):
+        _import_tkinter()
+        super().__init__()
+        # 持有 Tk 根窗口而不是继承 tk.Tk，无界面模式下定义本类不需要 tkinter
+        self.root = tk.Tk()
+
+        # --- Language Configuration ---
+        self.LANG = {
+            'zh': {
+                "title": "自动化邮件批量发送工具-历史警告信数据处理专版",
+                "quick_actions": "快捷操作",
+                "load_config": "从文件加载配置",
+                "lang_switch": "语言 (Language)",
+                "sender_settings": "1. 发件人设置 (推荐: 腾讯企业邮箱)",
+                "smtp_server": "SMTP服务器:",
+                "smtp_port": "SMTP端口:",
+                "sender_email": "发件人邮箱:",
+                "email_auth_code": "邮箱授权码:",
+                "max_messages_per_connection": "单连接最多发送封数:",
+                "sender_workers": "并发发送线程数:",
+                "messages_per_minute": "每分钟最多发送封数 (0=不限):",
+                "attachment_workers": "附件生成线程数:",
+                "send_retries": "临时失败重试次数:",
+                "data_files": "2. 数据与文件选择",
+                "select_source_file": "选择原始数据文件 (Excel):",
+                "browse": "浏览...",
+                "select_split_field": "选择用于拆分的字段:",
+                "loading_file": "正在后台读取文件...",
+                "english_config": "全英文处理配置 - 选择需要英文处理的拆分值:",
+                "select_mapping_file": "选择邮箱映射关系文件 (Excel):",
+                "select_save_location": "选择拆分后表格保存位置:",
+                "archive_attachments": "同时将附件保存到本地目录",
+                "select_journal_dir": "发送日志 (续传用) 目录，留空为用户数据目录:",
+                "dry_run": "演练模式：不连接邮件服务器，只生成 .eml 文件并统计各环节耗时",
+                "fresh": "重新发送全部：忽略发送日志中已发送的记录",
+                "email_content": "3. 邮件内容配置",
+                "subject_prefix": "邮件主题 (前缀):",
+                "use_filename_as_prefix": "使用源文件名作为前缀",
+                "cc_recipients": "抄送人员 (多个用英文分号';'隔开):",
+                "chinese_prefix": "中文邮件正文前缀:",
+                "chinese_suffix": "中文邮件正文后缀:",
+                "english_prefix": "英文邮件正文前缀:",
+                "english_suffix": "英文邮件正文后缀:",
+                "execution_progress": "4. 执行与进度",
+                "execute_button": "一键执行 (包含中英文智能处理)",
+                "success_title": "成功",
+                "config_loaded_msg": "已从文件成功加载配置。",
+                "error_title": "错误",
+                "config_load_error_msg": "无法读取或解析配置文件。\n请确保文件是两列（Key, Value）并且格式正确。\n\n错误详情: {}",
+                "file_read_error_msg": "无法读取文件表头或映射列: {}",
+                "all_tasks_complete_title": "完成",
+                "all_tasks_complete_msg": "所有邮件已成功发送！包含中英文智能处理和统计分析功能。\n\n已发送: {sent}，跳过: {skipped}，失败: {failed}",
+                "tasks_incomplete_title": "部分邮件未发送",
+                "tasks_incomplete_msg": "部分拆分值未能发送，请查看日志窗口和失败报告。\n\n已发送: {sent}，跳过: {skipped}，失败: {failed}",
+                "execution_error_title": "执行出错",
+                "execution_error_msg": "任务中断，请检查日志窗口中的错误信息。\n\n错误详情: {}"
+            },
+            'en': {
+                "title": "Automated Bulk Email Sender - Warning Letter Edition",
+                "quick_actions": "Quick Actions",
+                "load_config": "Load Config from File",
+                "lang_switch": "Language (语言)",
+                "sender_settings": "1. Sender Settings (Recommended: Tencent Exmail)",
+                "smtp_server": "SMTP Server:",
+                "smtp_port": "SMTP Port:",
+                "sender_email": "Sender Email:",
+                "email_auth_code": "Authorization Code:",
+                "max_messages_per_connection": "Max Emails per Connection:",
+                "sender_workers": "Sender Workers:",
+                "messages_per_minute": "Max Emails per Minute (0 = no limit):",
+                "attachment_workers": "Attachment Workers:",
+                "send_retries": "Retries on Temporary Failure:",
+                "data_files": "2. Data and File Selection",
+                "select_source_file": "Select Source Data File (Excel):",
+                "browse": "Browse...",
+                "select_split_field": "Select Field for Splitting:",
+                "loading_file": "Loading file in background...",
+                "english_config": "English Processing - Select values to process in English:",
+                "select_mapping_file": "Select Email Mapping File (Excel):",
+                "select_save_location": "Select Save Location for Split Files:",
+                "archive_attachments": "Also save attachments to this folder",
+                "select_journal_dir": "Send Journal Folder (blank = per-user data folder):",
+                "dry_run": "Dry run: write .eml files and time each stage instead of sending",
+                "fresh": "Resend all: ignore values the send journal marks as sent",
+                "email_content": "3. Email Content Configuration",
+                "subject_prefix": "Email Subject (Prefix):",
+                "use_filename_as_prefix": "Use source filename as prefix",
+                "cc_recipients": "CC (separate multiple with ';'):",
+                "chinese_prefix": "Chinese Email Body Prefix:",
+                "chinese_suffix": "Chinese Email Body Suffix:",
+                "english_prefix": "English Email Body Prefix:",
+                "english_suffix": "English Email Body Suffix:",
+                "execution_progress": "4. Execution and Progress",
+                "execute_button": "Execute All (with Smart CN/EN Handling)",
+                "success_title": "Success",
+                "config_loaded_msg": "Configuration has been successfully loaded from the file.",
+                "error_title": "Error",
+                "config_load_error_msg": "Could not read or parse the configuration file.\nPlease ensure it has two columns (Key, Value) and is correctly formatted.\n\nDetails: {}",
+                "file_read_error_msg": "Could not read file headers or map columns: {}",
+                "all_tasks_complete_title": "Complete",
+                "all_tasks_complete_msg": "All emails have been sent successfully! Includes smart CN/EN handling and statistical analysis.\n\nSent: {sent}, skipped: {skipped}, failed: {failed}",
+                "tasks_incomplete_title": "Some Emails Not Sent",
+                "tasks_incomplete_msg": "Some split values were not sent. Please check the log window and the failure report.\n\nSent: {sent}, skipped: {skipped}, failed: {failed}",
+                "execution_error_title": "Execution Error",
+                "execution_error_msg": "Task interrupted. Please check the log window for error messages.\n\nDetails: {}"
+            }
+        }
+        self.current_lang = 'zh' # Default language
+
+        self.use_filename_as_subject_var = tk.BooleanVar(value=False)
+        # 后台加载：每次新的选择递增代号，旧代号的结果到达后直接丢弃
+        self.load_results = queue.Queue()
+        self.load_generation = 0
+        self.pending_load = None
+        self.load_poll_scheduled = False
+        # 发送线程只向队列写入日志、进度和结束结果，由 Tk 主循环定时刷新，工作线程从不直接操作控件
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.dropped_log_count = 0
+        self.pending_progress = None
+        self.send_results = queue.Queue()
+
+        self.setup_ui()
+        self.update_ui_language()
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
+
+    def setup_ui(self):
+        self.root.geometry("1200x900")
+
+        # --- Main canvas with a scrollbar ---
+        self.canvas = tk.Canvas(self.root)
+        scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=self.canvas.yview)
+        self.scrollable_frame = ttk.Frame(self.canvas)
+
+        self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+
+        self.canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        self.bind_mousewheel()
+
+        # --- Root layout frame (inside the scrollable area) ---
+        root_frame = ttk.Frame(self.scrollable_frame, padding="10")
+        root_frame.pack(fill=tk.BOTH, expand=True)
+        root_frame.columnconfigure(0, weight=1) # Main content column expands
+        root_frame.columnconfigure(1, weight=0) # Sidebar column has fixed width
+
+        self.create_widgets(root_frame)
+
+    def create_widgets(self, root_frame):
+        # --- Left Column: Main Configuration ---
+        left_column_frame = ttk.Frame(root_frame)
+        left_column_frame.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
+
+        # --- Right Column: Quick Actions ---
+        right_column_frame = ttk.Frame(root_frame)
+        right_column_frame.grid(row=0, column=1, sticky="ns")
+
+        # --- Language Switcher ---
+        lang_frame = ttk.LabelFrame(right_column_frame, padding="10")
+        self.lang_frame_label = lang_frame
+        lang_frame.pack(fill=tk.X, pady=5)
+        
+        lang_buttons_frame = ttk.Frame(lang_frame)
+        lang_buttons_frame.pack()
+        ttk.Button(lang_buttons_frame, text="中文", command=lambda: self.switch_language('zh'), width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Button(lang_buttons_frame, text="English", command=lambda: self.switch_language('en'), width=8).pack(side=tk.LEFT, padx=5)
+        
+        # --- Config Loader ---
+        config_frame = ttk.LabelFrame(right_column_frame, padding="10")
+        self.config_frame_label = config_frame
+        config_frame.pack(fill=tk.X, pady=5)
+        
+        self.load_config_button = ttk.Button(config_frame, command=self.load_configuration_file)
+        self.load_config_button.pack(pady=10, fill=tk.X, ipady=4)
+
+        # --- 1. Sender Settings ---
+        self.sender_frame = ttk.LabelFrame(left_column_frame, padding="10")
+        self.sender_frame.pack(fill=tk.X, pady=5)
+        
+        self.smtp_server_label = ttk.Label(self.sender_frame)
+        self.smtp_server_label.grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.smtp_server_var = tk.StringVar(value=self.DEFAULT_SETTINGS["smtp_server"])
+        ttk.Entry(self.sender_frame, textvariable=self.smtp_server_var, width=30).grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+
+        self.smtp_port_label = ttk.Label(self.sender_frame)
+        self.smtp_port_label.grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.smtp_port_var = tk.StringVar(value=self.DEFAULT_SETTINGS["smtp_port"])
+        ttk.Entry(self.sender_frame, textvariable=self.smtp_port_var, width=10).grid(row=1, column=3, padx=5, pady=5)
+
+        self.sender_email_label = ttk.Label(self.sender_frame)
+        self.sender_email_label.grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.sender_email_var = tk.StringVar()
+        ttk.Entry(self.sender_frame, textvariable=self.sender_email_var, width=30).grid(row=2, column=1, padx=5, pady=5, sticky="ew")
+
+        self.password_label = ttk.Label(self.sender_frame)
+        self.password_label.grid(row=2, column=2, padx=5, pady=5, sticky="w")
+        self.password_var = tk.StringVar()
+        ttk.Entry(self.sender_frame, textvariable=self.password_var, show="*", width=20).grid(row=2, column=3, padx=5, pady=5, sticky="ew")
+
+        self.max_messages_label = ttk.Label(self.sender_frame)
+        self.max_messages_label.grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.max_messages_var = tk.StringVar(value=self.DEFAULT_SETTINGS["max_messages_per_connection"])
+        ttk.Entry(self.sender_frame, textvariable=self.max_messages_var, width=10).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
+        self.sender_workers_label = ttk.Label(self.sender_frame)
+        self.sender_workers_label.grid(row=3, column=2, padx=5, pady=5, sticky="w")
+        self.sender_workers_var = tk.StringVar(value=self.DEFAULT_SETTINGS["sender_workers"])
+        ttk.Entry(self.sender_frame, textvariable=self.sender_workers_var, width=10).grid(row=3, column=3, padx=5, pady=5, sticky="w")
+
+        self.messages_per_minute_label = ttk.Label(self.sender_frame)
+        self.messages_per_minute_label.grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        self.messages_per_minute_var = tk.StringVar(value=self.DEFAULT_SETTINGS["messages_per_minute"])
+        ttk.Entry(self.sender_frame, textvariable=self.messages_per_minute_var, width=10).grid(row=4, column=1, padx=5, pady=5, sticky="w")
+
+        self.attachment_workers_label = ttk.Label(self.sender_frame)
+        self.attachment_workers_label.grid(row=4, column=2, padx=5, pady=5, sticky="w")
+        self.attachment_workers_var = tk.StringVar(value=self.DEFAULT_SETTINGS["attachment_workers"])
+        ttk.Entry(self.sender_frame, textvariable=self.attachment_workers_var, width=10).grid(row=4, column=3, padx=5, pady=5, sticky="w")
+
+        self.send_retries_label = ttk.Label(self.sender_frame)
+        self.send_retries_label.grid(row=5, column=0, padx=5, pady=5, sticky="w")
+        self.send_retries_var = tk.StringVar(value=self.DEFAULT_SETTINGS["send_retries"])
+        ttk.Entry(self.sender_frame, textvariable=self.send_retries_var, width=10).grid(row=5, column=1, padx=5, pady=5, sticky="w")
+        
+        # --- 2. Data and File Selection ---
+        self.data_frame = ttk.LabelFrame(left_column_frame, padding="10")
+        self.data_frame.pack(fill=tk.X, pady=5)
+        self.data_frame.columnconfigure(1, weight=1)
+
+        self.source_file_label = ttk.Label(self.data_frame)
+        self.source_file_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.source_file_var = tk.StringVar()
+        ttk.Entry(self.data_frame, textvariable=self.source_file_var).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.browse_button1 = ttk.Button(self.data_frame, command=self.select_source_file)
         self.browse_button1.grid(row=0, column=2, padx=5, pady=5)
         
         self.split_column_label = ttk.Label(self.data_frame)
@@ -235,6 +1417,8 @@ class EmailSenderApp(tk.Tk):
         self.split_column_combo = ttk.Combobox(self.data_frame, textvariable=self.split_column_var, state="readonly")
         self.split_column_combo.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         self.split_column_combo.bind('<<ComboboxSelected>>', self.on_split_column_selected)
+        self.loading_label = ttk.Label(self.data_frame, foreground="gray")
+        self.loading_label.grid(row=1, column=2, padx=5, pady=5, sticky="w")
 
         self.english_config_label = ttk.Label(self.data_frame)
         self.english_config_label.grid(row=2, column=0, columnspan=3, padx=5, pady=5, sticky="w")
@@ -256,6 +1440,16 @@ class EmailSenderApp(tk.Tk):
         ttk.Entry(self.data_frame, textvariable=self.save_dir_var).grid(row=5, column=1, padx=5, pady=5, sticky="ew")
         self.browse_button3 = ttk.Button(self.data_frame, command=self.select_save_directory)
         self.browse_button3.grid(row=5, column=2, padx=5, pady=5)
+        self.archive_attachments_var = tk.BooleanVar(value=self.parse_bool(self.DEFAULT_SETTINGS["archive_attachments"]))
+        self.archive_checkbox = ttk.Checkbutton(self.data_frame, variable=self.archive_attachments_var)
+        self.archive_checkbox.grid(row=6, column=1, padx=5, pady=2, sticky="w")
+
+        self.journal_dir_label = ttk.Label(self.data_frame)
+        self.journal_dir_label.grid(row=7, column=0, padx=5, pady=5, sticky="w")
+        self.journal_dir_var = tk.StringVar(value=self.DEFAULT_SETTINGS["journal_dir"])
+        ttk.Entry(self.data_frame, textvariable=self.journal_dir_var).grid(row=7, column=1, padx=5, pady=5, sticky="ew")
+        self.browse_button4 = ttk.Button(self.data_frame, command=self.select_journal_directory)
+        self.browse_button4.grid(row=7, column=2, padx=5, pady=5)
 
         # --- 3. Email Content ---
         self.content_frame = ttk.LabelFrame(left_column_frame, padding="10")
@@ -300,6 +1494,13 @@ class EmailSenderApp(tk.Tk):
         self.exec_frame = ttk.LabelFrame(left_column_frame, padding="10")
         self.exec_frame.pack(fill=tk.BOTH, expand=True, pady=5)
 
+        self.dry_run_var = tk.BooleanVar(value=self.parse_bool(self.DEFAULT_SETTINGS["dry_run"]))
+        self.dry_run_checkbox = ttk.Checkbutton(self.exec_frame, variable=self.dry_run_var)
+        self.dry_run_checkbox.pack(anchor="w", padx=5)
+        self.fresh_var = tk.BooleanVar(value=self.parse_bool(self.DEFAULT_SETTINGS["fresh"]))
+        self.fresh_checkbox = ttk.Checkbutton(self.exec_frame, variable=self.fresh_var)
+        self.fresh_checkbox.pack(anchor="w", padx=5)
+
         self.start_button = ttk.Button(self.exec_frame, command=self.start_sending_thread)
         self.start_button.pack(pady=10, ipady=4)
 
@@ -325,7 +1526,7 @@ class EmailSenderApp(tk.Tk):
 
     def update_ui_language(self):
         lang_dict = self.LANG[self.current_lang]
-        self.title(lang_dict["title"])
+        self.root.title(lang_dict["title"])
         
         # Quick Actions
         self.lang_frame_label.config(text=lang_dict["lang_switch"])
@@ -338,6 +1539,11 @@ class EmailSenderApp(tk.Tk):
         self.smtp_port_label.config(text=lang_dict["smtp_port"])
         self.sender_email_label.config(text=lang_dict["sender_email"])
         self.password_label.config(text=lang_dict["email_auth_code"])
+        self.max_messages_label.config(text=lang_dict["max_messages_per_connection"])
+        self.sender_workers_label.config(text=lang_dict["sender_workers"])
+        self.messages_per_minute_label.config(text=lang_dict["messages_per_minute"])
+        self.attachment_workers_label.config(text=lang_dict["attachment_workers"])
+        self.send_retries_label.config(text=lang_dict["send_retries"])
 
         # Data and Files
         self.data_frame.config(text=lang_dict["data_files"])
@@ -345,10 +1551,16 @@ class EmailSenderApp(tk.Tk):
         self.browse_button1.config(text=lang_dict["browse"])
         self.browse_button2.config(text=lang_dict["browse"])
         self.browse_button3.config(text=lang_dict["browse"])
+        self.browse_button4.config(text=lang_dict["browse"])
         self.split_column_label.config(text=lang_dict["select_split_field"])
+        self.loading_label.config(text=lang_dict["loading_file"] if self.pending_load is not None else "")
         self.english_config_label.config(text=lang_dict["english_config"])
         self.mapping_file_label.config(text=lang_dict["select_mapping_file"])
         self.save_dir_label.config(text=lang_dict["select_save_location"])
+        self.archive_checkbox.config(text=lang_dict["archive_attachments"])
+        self.journal_dir_label.config(text=lang_dict["select_journal_dir"])
+        self.dry_run_checkbox.config(text=lang_dict["dry_run"])
+        self.fresh_checkbox.config(text=lang_dict["fresh"])
 
         # Email Content
         self.content_frame.config(text=lang_dict["email_content"])
@@ -385,11 +1597,53 @@ class EmailSenderApp(tk.Tk):
         self.canvas.bind('<Leave>', _unbind_from_mousewheel)
 
     def log(self, message):
-        self.status_log.config(state="normal")
-        self.status_log.insert(tk.END, message + "\n")
-        self.status_log.see(tk.END)
-        self.status_log.config(state="disabled")
-        self.update_idletasks()
+        try:
+            self.log_queue.put_nowait(message + "\n")
+        except queue.Full:
+            self.dropped_log_count += 1
+
+    def set_progress(self, done, total):
+        # 进度条只需最新值，由刷新定时器读取
+        self.pending_progress = (done, total)
+
+    def drain_log_queue(self):
+        """Flush queued log lines, the latest progress and finished sends into the widgets on the Tk thread."""
+        if self.pending_progress is not None:
+            done, total = self.pending_progress
+            self.pending_progress = None
+            self.progress['maximum'] = total
+            self.progress['value'] = done
+
+        lines = []
+        while True:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if self.dropped_log_count:
+            lines.append(f"Log queue full, dropped {self.dropped_log_count} log lines.\n")
+            self.dropped_log_count = 0
+
+        if lines:
+            self.status_log.config(state="normal")
+            self.status_log.insert(tk.END, "".join(lines))
+            # 控件仅保留最近 LOG_MAX_LINES 行
+            line_count = int(self.status_log.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.status_log.delete('1.0', f"{line_count - LOG_MAX_LINES + 1}.0")
+            self.status_log.see(tk.END)
+            self.status_log.config(state="disabled")
+
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self.drain_log_queue)
+
+        # 日志先于结果入队，结束对话框显示时日志已全部刷新
+        while True:
+            try:
+                outcomes, error = self.send_results.get_nowait()
+            except queue.Empty:
+                break
+            self.finish_sending(outcomes, error)
 
     def load_configuration_file(self):
         filepath = filedialog.askopenfilename(
@@ -400,12 +1654,16 @@ class EmailSenderApp(tk.Tk):
             return
 
         try:
-            df = pd.read_csv(filepath, header=None) if filepath.endswith('.csv') else pd.read_excel(filepath, header=None)
-            config_dict = pd.Series(df.iloc[:, 1].values, index=df.iloc[:, 0]).dropna().to_dict()
+            config_dict = self.read_config_file(filepath)
 
             UI_VARS_MAP = {
                 "smtp_server": self.smtp_server_var, "smtp_port": self.smtp_port_var,
                 "sender_email": self.sender_email_var, "password": self.password_var,
+                "max_messages_per_connection": self.max_messages_var,
+                "sender_workers": self.sender_workers_var, "messages_per_minute": self.messages_per_minute_var,
+                "attachment_workers": self.attachment_workers_var, "send_retries": self.send_retries_var,
+                "archive_attachments": self.archive_attachments_var, "dry_run": self.dry_run_var,
+                "journal_dir": self.journal_dir_var, "fresh": self.fresh_var,
                 "subject_prefix": self.subject_var, "cc_recipients": self.cc_var,
                 "chinese_prefix": self.chinese_prefix_text, "chinese_suffix": self.chinese_suffix_text,
                 "english_prefix": self.english_prefix_text, "english_suffix": self.english_suffix_text
@@ -413,7 +1671,9 @@ class EmailSenderApp(tk.Tk):
 
             for key, value in config_dict.items():
                 widget = UI_VARS_MAP.get(key)
-                if isinstance(widget, tk.StringVar):
+                if isinstance(widget, tk.BooleanVar):
+                    widget.set(self.parse_bool(value))
+                elif isinstance(widget, tk.StringVar):
                     widget.set(str(value))
                 elif isinstance(widget, tk.Text):
                     widget.delete("1.0", tk.END)
@@ -427,77 +1687,112 @@ class EmailSenderApp(tk.Tk):
             self.log(f"Error: Failed to load config file: {e}")
             messagebox.showerror(self.LANG[self.current_lang]["error_title"], error_msg)
 
-    def _get_column_mappings(self, df_columns):
-        self.log("Starting smart column name mapping...")
-        self.COLUMN_MAP = {}
-        df_columns_lower = {col.lower().strip(): col for col in df_columns}
+    def start_background_load(self, task, on_success, on_error):
+        """
+        Run task() in a worker thread and hand its result to on_success (or the exception to on_error)
+        on the Tk thread. Starting a new load supersedes any load still in flight: its result is discarded.
+        """
+        self.load_generation += 1
+        generation = self.load_generation
+        self.pending_load = (generation, on_success, on_error)
+        self.set_loading_state(True)
+
+        def worker():
+            try:
+                self.load_results.put((generation, task(), None))
+            except Exception as e:
+                self.load_results.put((generation, None, e))
 
-        for key, possible_names in self.KEY_COLS.items():
-            found = False
-            for name in possible_names:
-                for lower_col, original_col in df_columns_lower.items():
-                    if name in lower_col:
-                        self.COLUMN_MAP[key] = original_col
-                        self.log(f"  ✓ Mapped successfully: '{key}' -> '{original_col}'")
-                        found = True
-                        break
-                if found:
-                    break
-        
-        for crit_col in self.CRITICAL_COLS:
-            if crit_col not in self.COLUMN_MAP:
-                raise ValueError(f"Critical column missing! The program could not find a column representing '{crit_col}'. Please ensure the file contains a header with one of the keywords: {self.KEY_COLS[crit_col]}")
+        threading.Thread(target=worker, daemon=True).start()
+        if not self.load_poll_scheduled:
+            self.load_poll_scheduled = True
+            self.root.after(LOAD_POLL_INTERVAL_MS, self.poll_background_loads)
 
-        self.log("Smart column name mapping complete.")
-        return self.COLUMN_MAP
+    def poll_background_loads(self):
+        """Deliver finished background loads on the Tk thread; keeps polling while a load is pending."""
+        self.load_poll_scheduled = False
+        while True:
+            try:
+                generation, result, error = self.load_results.get_nowait()
+            except queue.Empty:
+                break
+            if self.pending_load is None or generation != self.pending_load[0]:
+                continue  # 已被更新的选择取代
+            _, on_success, on_error = self.pending_load
+            self.pending_load = None
+            self.set_loading_state(False)
+            try:
+                on_success(result) if error is None else on_error(error)
+            except Exception as callback_error:
+                on_error(callback_error)
+
+        if self.pending_load is not None:
+            self.load_poll_scheduled = True
+            self.root.after(LOAD_POLL_INTERVAL_MS, self.poll_background_loads)
+
+    def set_loading_state(self, busy):
+        self.loading_label.config(text=self.LANG[self.current_lang]["loading_file"] if busy else "")
+        self.split_column_combo.config(state="disabled" if busy else "readonly")
+        self.root.config(cursor="watch" if busy else "")
 
     def select_source_file(self):
         filepath = filedialog.askopenfilename(title="Select Source Data File", filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV files", "*.csv")])
         if filepath:
             self.source_file_var.set(filepath)
-            try:
-                df = pd.read_csv(filepath) if filepath.endswith('.csv') else pd.read_excel(filepath)
-                
-                self.split_column_combo['values'] = list(df.columns)
-                self.log(f"Successfully loaded source file: {os.path.basename(filepath)}")
-                self.log("Please select the field for splitting from the dropdown menu.")
-                
-                self.source_df = df
-                self._get_column_mappings(df.columns)
-            except Exception as e:
-                error_msg = self.LANG[self.current_lang]["file_read_error_msg"].format(e)
-                messagebox.showerror(self.LANG[self.current_lang]["error_title"], error_msg)
-                self.log(f"Error: Could not read or map file {os.path.basename(filepath)}. Details: {e}")
+            self.log(f"Reading headers of {os.path.basename(filepath)} in background...")
+            # 只读取表头用于下拉框，完整数据在选择拆分字段时读取并缓存
+            self.start_background_load(
+                lambda: self.source_cache.read_columns(filepath),
+                lambda columns: self.on_source_columns_loaded(filepath, columns),
+                lambda e: self.on_source_load_failed(filepath, e)
+            )
+
+    def on_source_columns_loaded(self, filepath, columns):
+        self.split_column_combo['values'] = columns
+        self.log(f"Successfully loaded source file: {os.path.basename(filepath)}")
+        self.log("Please select the field for splitting from the dropdown menu.")
+        
+        self._get_column_mappings(columns)
+
+    def on_source_load_failed(self, filepath, e):
+        error_msg = self.LANG[self.current_lang]["file_read_error_msg"].format(e)
+        messagebox.showerror(self.LANG[self.current_lang]["error_title"], error_msg)
+        self.log(f"Error: Could not read or map file {os.path.basename(filepath)}. Details: {e}")
 
     def on_split_column_selected(self, event=None):
-        if not hasattr(self, 'source_df') or self.source_df is None: return
+        source_file = self.source_file_var.get()
+        if not source_file: return
         
         split_column = self.split_column_var.get()
         if not split_column: return
         
-        try:
-            unique_values = sorted(self.source_df[split_column].dropna().unique())
-            self.split_field_values = [str(val) for val in unique_values]
-            
-            for widget in self.english_checkbox_widgets.values(): widget.destroy()
-            self.english_checkboxes.clear()
-            self.english_checkbox_widgets.clear()
-            
-            self.log(f"Detected {len(self.split_field_values)} unique values in split field '{split_column}'")
-            
-            max_cols = 4
-            for i, value in enumerate(self.split_field_values):
-                row, col = i // max_cols, i % max_cols
-                var = tk.BooleanVar()
-                self.english_checkboxes[value] = var
-                checkbox = ttk.Checkbutton(self.english_values_frame, text=f"{value}", variable=var, command=self.update_english_processing_values)
-                checkbox.grid(row=row, column=col, padx=10, pady=2, sticky="w")
-                self.english_checkbox_widgets[value] = checkbox
-            
-            self.log("You can now select values that require full English processing (multiple or none).")
-            
-        except Exception as e:
-            self.log(f"Error processing split field: {e}")
+        self.log(f"Loading values of split field '{split_column}' in background...")
+        # Excel 按列读取几乎与整表解析同样耗时，因此直接完整加载并缓存，发送时复用
+        self.start_background_load(
+            lambda: sorted(self.source_cache.load(source_file)[split_column].dropna().unique()),
+            lambda unique_values: self.on_split_values_loaded(split_column, unique_values),
+            lambda e: self.log(f"Error processing split field: {e}")
+        )
+
+    def on_split_values_loaded(self, split_column, unique_values):
+        self.split_field_values = [str(val) for val in unique_values]
+        
+        for widget in self.english_checkbox_widgets.values(): widget.destroy()
+        self.english_checkboxes.clear()
+        self.english_checkbox_widgets.clear()
+        
+        self.log(f"Detected {len(self.split_field_values)} unique values in split field '{split_column}'")
+        
+        max_cols = 4
+        for i, value in enumerate(self.split_field_values):
+            row, col = i // max_cols, i % max_cols
+            var = tk.BooleanVar()
+            self.english_checkboxes[value] = var
+            checkbox = ttk.Checkbutton(self.english_values_frame, text=f"{value}", variable=var, command=self.update_english_processing_values)
+            checkbox.grid(row=row, column=col, padx=10, pady=2, sticky="w")
+            self.english_checkbox_widgets[value] = checkbox
+        
+        self.log("You can now select values that require full English processing (multiple or none).")
 
     def update_english_processing_values(self):
         self.english_processing_values = {value for value, var in self.english_checkboxes.items() if var.get()}
@@ -518,6 +1813,12 @@ class EmailSenderApp(tk.Tk):
         if dirpath:
             self.save_dir_var.set(dirpath)
             self.log(f"Split files will be saved to: {dirpath}")
+
+    def select_journal_directory(self):
+        dirpath = filedialog.askdirectory(title="Select Send Journal Folder")
+        if dirpath:
+            self.journal_dir_var.set(dirpath)
+            self.log(f"Send journal will be kept in: {dirpath}")
             
     def start_sending_thread(self):
         self.start_button.config(state="disabled")
@@ -531,387 +1832,163 @@ class EmailSenderApp(tk.Tk):
         else:
             self.log("No values selected for English processing; will use default Chinese mode.")
         
-        processing_thread = threading.Thread(target=self.process_and_send_emails)
+        # 设置和模板在 Tk 线程中读取，发送线程只拿到普通的字典
+        self.log("Starting task, checking parameters...")
+        try:
+            params = self.collect_send_params()
+            templates = self.read_email_templates()
+        except Exception as e:
+            self.log(f"A fatal error occurred: {e}")
+            self.finish_sending(None, e)
+            return
+
+        processing_thread = threading.Thread(target=self.process_and_send_emails, args=(params, templates))
         processing_thread.daemon = True 
         processing_thread.start()
 
-    def preprocess_data(self, df):
-        self.log("Starting data preprocessing and standardization...")
-        df = df.copy() 
-
-        warning_type_col = self.COLUMN_MAP.get('warning_type')
-        if warning_type_col:
-            self.log(f"Standardizing '{warning_type_col}' column...")
-            df[warning_type_col] = df[warning_type_col].astype(str)
-
-            def standardize_warning_type(value):
-                value = str(value).strip()
-                if re.search('[\u4e00-\u9fff]', value):
-                    if "严厉" in value: return "严厉警告"
-                    elif "口述" in value: return "口述警告"
-                    return value 
-                else:
-                    if "stern" in value.lower(): return "Stern Reminder"
-                    elif "verbal" in value.lower(): return "Verbal Warning"
-                    return value
-            
-            df[warning_type_col] = df[warning_type_col].apply(standardize_warning_type)
-            self.log("  - 'Warning Type' field values unified based on original language (CN/EN).")
-
-        sending_status_col = self.COLUMN_MAP.get('sending_status')
-        if sending_status_col:
-            self.log(f"Standardizing '{sending_status_col}' column...")
-            df[sending_status_col] = df[sending_status_col].astype(str)
-            df.loc[df[sending_status_col].str.contains("待发送", na=False), sending_status_col] = "已发送"
-            df.loc[df[sending_status_col].str.contains("Pending", na=False, case=False), sending_status_col] = "Has been sent"
-            self.log("  - 'Sending Status' field values unified based on keywords.")
-
-        self.log("Data preprocessing and standardization complete.")
-        return df
-
-    def is_english_processing_required(self, area_name):
-        return str(area_name).strip() in self.english_processing_values
-
-    def generate_sheet_names(self, is_english=False):
-        return self.SHEET_NAMES['english' if is_english else 'chinese']
-
-    def count_warnings_per_employee(self, df):
-        id_col, warning_type_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('warning_type')
-        if not id_col or not warning_type_col:
-            self.log("Error: Cannot count warnings as employee ID or warning type column is not mapped.")
-            return {}
-
-        mapping_for_stats = {"严厉警告": "Stern Reminder", "口述警告": "Verbal Warning"}
-        temp_warning_types = df[warning_type_col].replace(mapping_for_stats)
-        
-        warning_counts_df = df.groupby([id_col, temp_warning_types]).size().unstack(fill_value=0)
-        
-        result = {}
-        for emp_id in df[id_col].unique():
-            counts = warning_counts_df.loc[emp_id] if emp_id in warning_counts_df.index else {}
-            result[emp_id] = {"Stern Reminder": counts.get("Stern Reminder", 0), "Verbal Warning": counts.get("Verbal Warning", 0)}
-        return result
-
-    def generate_warning_analysis_sheets(self, df_split, all_employees_warning_counts, is_english=False):
-        sheets_data = {}
-        sheet_names = self.generate_sheet_names(is_english)
-        field_mappings = self.FIELD_MAPPINGS['english' if is_english else 'chinese']
-        
-        id_col, branch_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('branch')
-        base_columns_keys = ['area', 'district', 'branch', 'ops', 'position', 'id', 'name', 'status', 'employment_type']
-        available_base_columns = [self.COLUMN_MAP[key] for key in base_columns_keys if key in self.COLUMN_MAP]
-        
-        unique_employees_in_split = df_split.drop_duplicates(subset=[id_col])
-
-        two_stern_employees, three_plus_stern_employees = [], []
-        for _, emp_data in unique_employees_in_split.iterrows():
-            emp_id = emp_data[id_col]
-            counts = all_employees_warning_counts.get(emp_id, {"Stern Reminder": 0, "Verbal Warning": 0})
-            
-            row_data = emp_data[available_base_columns].to_dict()
-            if is_english:
-                row_data["Stern Reminder"], row_data["Verbal Warning"] = counts["Stern Reminder"], counts["Verbal Warning"]
-            else:
-                row_data["严厉警告 Stern Reminder"], row_data["口述警告 Verbal Warning"] = counts["Stern Reminder"], counts["Verbal Warning"]
-            
-            if counts["Stern Reminder"] == 2:
-                two_stern_employees.append(row_data)
-            elif counts["Stern Reminder"] >= 3:
-                three_plus_stern_employees.append(row_data)
-        
-        if two_stern_employees:
-            df_2x = pd.DataFrame(two_stern_employees).sort_values(list(two_stern_employees[0].keys())[-2], ascending=False)
-            sheets_data[sheet_names["2x_stern"]] = df_2x
-            self.log(f"Analysis generated '{sheet_names['2x_stern']}': {len(two_stern_employees)} employees")
-        
-        if three_plus_stern_employees:
-            df_3x = pd.DataFrame(three_plus_stern_employees).sort_values(list(three_plus_stern_employees[0].keys())[-2], ascending=False)
-            sheets_data[sheet_names["3x_stern"]] = df_3x
-            self.log(f"Analysis generated '{sheet_names['3x_stern']}': {len(three_plus_stern_employees)} employees")
-        
-        if branch_col:
-            branch_risk_data = []
-            for branch in df_split[branch_col].dropna().unique():
-                branch_employees_df = df_split[df_split[branch_col] == branch]
-                branch_employee_ids = branch_employees_df[id_col].unique()
-                count_2x = sum(1 for emp_id in branch_employee_ids if all_employees_warning_counts.get(emp_id, {}).get("Stern Reminder", 0) == 2)
-                count_3x_plus = sum(1 for emp_id in branch_employee_ids if all_employees_warning_counts.get(emp_id, {}).get("Stern Reminder", 0) >= 3)
-                if count_2x > 0 or count_3x_plus > 0:
-                    branch_info = branch_employees_df.iloc[0]
-                    risk_row = {
-                        self.COLUMN_MAP.get('area', 'Area'): branch_info.get(self.COLUMN_MAP.get('area')),
-                        self.COLUMN_MAP.get('district', 'District'): branch_info.get(self.COLUMN_MAP.get('district')),
-                        branch_col: branch, self.COLUMN_MAP.get('ops', 'OPS'): branch_info.get(self.COLUMN_MAP.get('ops')),
-                        field_mappings["满2次严厉警告员工人数"]: count_2x, field_mappings["超3次及以上严厉警告员工人数"]: count_3x_plus
-                    }
-                    branch_risk_data.append(risk_row)
-            
-            if branch_risk_data:
-                branch_risk_df = pd.DataFrame(branch_risk_data)
-                branch_risk_df["_total_risk"] = branch_risk_df[field_mappings["满2次严厉警告员工人数"]].fillna(0) + branch_risk_df[field_mappings["超3次及以上严厉警告员工人数"]].fillna(0)
-                branch_risk_df = branch_risk_df.sort_values("_total_risk", ascending=False).drop("_total_risk", axis=1)
-                sheets_data[sheet_names["branch_risk"]] = branch_risk_df
-                self.log(f"Analysis generated '{sheet_names['branch_risk']}': {len(branch_risk_df)} branches")
-        
-        return sheets_data
-
-    def generate_statistics_summary(self, df_split, all_employees_warning_counts, is_english=False):
-        id_col, branch_col, status_col = self.COLUMN_MAP.get('id'), self.COLUMN_MAP.get('branch'), self.COLUMN_MAP.get('status')
-        unique_employees = df_split.drop_duplicates(subset=[id_col])
-        
-        count_2x_total, count_3x_plus_total = 0, 0
-        status_2x_count, status_3x_plus_count = {}, {}
-        
-        for _, emp_data in unique_employees.iterrows():
-            emp_id = emp_data[id_col]
-            counts = all_employees_warning_counts.get(emp_id, {"Stern Reminder": 0, "Verbal Warning": 0})
-            status = emp_data.get(status_col, "未知" if not is_english else "Unknown")
-            
-            if counts["Stern Reminder"] == 2:
-                count_2x_total += 1
-                status_2x_count[status] = status_2x_count.get(status, 0) + 1
-            elif counts["Stern Reminder"] >= 3:
-                count_3x_plus_total += 1
-                status_3x_plus_count[status] = status_3x_plus_count.get(status, 0) + 1
-        
-        branch_risk_details = {}
-        if branch_col:
-            for branch in df_split[branch_col].dropna().unique():
-                details = {'total': 0, '2x_count': 0, '3x_plus_count': 0, '2x_status_breakdown': {}, '3x_plus_status_breakdown': {}}
-                branch_employees = df_split[df_split[branch_col] == branch].drop_duplicates(subset=[id_col])
-                for _, emp_data in branch_employees.iterrows():
-                    emp_id, status = emp_data[id_col], emp_data.get(status_col, "未知" if not is_english else "Unknown")
-                    counts = all_employees_warning_counts.get(emp_id, {})
-                    if counts.get("Stern Reminder", 0) == 2:
-                        details['2x_count'] += 1
-                        details['2x_status_breakdown'][status] = details['2x_status_breakdown'].get(status, 0) + 1
-                    elif counts.get("Stern Reminder", 0) >= 3:
-                        details['3x_plus_count'] += 1
-                        details['3x_plus_status_breakdown'][status] = details['3x_plus_status_breakdown'].get(status, 0) + 1
-                details['total'] = details['2x_count'] + details['3x_plus_count']
-                if details['total'] > 0: branch_risk_details[branch] = details
-        
-        top_5_branches = sorted(branch_risk_details.items(), key=lambda x: x[1]['total'], reverse=True)[:5]
-        
-        if is_english:
-            return f"""=== WARNING STATISTICS SUMMARY ===
-
-Total Employees Analysis:
-- Employees with exactly 2 Stern Reminders: {count_2x_total}
-- Employees with 3+ Stern Reminders: {count_3x_plus_total}
-
-Work Status Distribution (2 Stern Reminders):
-{self._format_status_breakdown(status_2x_count, is_english)}
-
-Work Status Distribution (3+ Stern Reminders):
-{self._format_status_breakdown(status_3x_plus_count, is_english)}
-
-Branches Involved: {len(branch_risk_details)}
+    def read_email_templates(self):
+        """Read the (prefix, suffix) body templates for both languages from the text widgets."""
+        return {
+            'chinese': (self.chinese_prefix_text.get("1.0", tk.END).strip(), self.chinese_suffix_text.get("1.0", tk.END).strip()),
+            'english': (self.english_prefix_text.get("1.0", tk.END).strip(), self.english_suffix_text.get("1.0", tk.END).strip())
+        }
 
-Top 5 High-Risk Branches:
-{self._format_top_branches_detailed(top_5_branches, is_english)}
-===============================""".strip()
+    def collect_send_params(self):
+        """Read the send settings from the widgets; must run on the Tk thread."""
+        subject_prefix = ""
+        if self.use_filename_as_subject_var.get():
+            source_file_path = self.source_file_var.get()
+            if not source_file_path: raise ValueError("Please select a source data file before using its name as the subject.")
+            subject_prefix = os.path.splitext(os.path.basename(source_file_path))[0]
+            self.log(f"Email subject prefix set to source filename: '{subject_prefix}'")
         else:
-            return f"""=== 警告统计总结 ===
-
-员工总体分析:
-- 累计2次严厉警告员工: {count_2x_total}人
-- 累计3次及以上严厉警告员工: {count_3x_plus_total}人
-
-在职状态分布 (2次严厉警告):
-{self._format_status_breakdown(status_2x_count, is_english)}
-
-在职状态分布 (3次及以上严厉警告):
-{self._format_status_breakdown(status_3x_plus_count, is_english)}
-
-涉及网点数量: {len(branch_risk_details)}个
-
-高风险网点排名前5:
-{self._format_top_branches_detailed(top_5_branches, is_english)}
-====================""".strip()
-
-    def _format_status_breakdown(self, status_count, is_english=False):
-        if not status_count: return "- 无数据" if not is_english else "- No data"
-        return "\n".join([f"- {status}: {count}{'人' if not is_english else ''}" for status, count in status_count.items()])
-
-    def _format_status_breakdown_inline(self, breakdown_dict, is_english=False):
-        if not breakdown_dict: return ""
-        items = [f"{status}: {count}{'人' if not is_english else ''}" for status, count in breakdown_dict.items()]
-        return ", ".join(items)
-
-    def _format_top_branches_detailed(self, top_branches, is_english=False):
-        if not top_branches: return "- 无数据" if not is_english else "- No data"
-        result = []
-        for i, (branch, details) in enumerate(top_branches, 1):
-            if is_english:
-                branch_str = f"{i}. {branch} - Total Risk: {details['total']}"
-                if details['3x_plus_count'] > 0:
-                    branch_str += f"\n   - Employees with 3+ Stern Reminders: {details['3x_plus_count']}; Status: {self._format_status_breakdown_inline(details['3x_plus_status_breakdown'], is_english)}"
-                if details['2x_count'] > 0:
-                    branch_str += f"\n   - Employees with 2 Stern Reminders: {details['2x_count']}; Status: {self._format_status_breakdown_inline(details['2x_status_breakdown'], is_english)}"
-            else:
-                branch_str = f"{i}. {branch} - 总风险人数: {details['total']}人"
-                if details['3x_plus_count'] > 0:
-                    branch_str += f"\n   - 累计3次及以上严厉警告员工: {details['3x_plus_count']}人；状态: {self._format_status_breakdown_inline(details['3x_plus_status_breakdown'], is_english)}"
-                if details['2x_count'] > 0:
-                    branch_str += f"\n   - 累计2次严厉警告员工: {details['2x_count']}人；状态: {self._format_status_breakdown_inline(details['2x_status_breakdown'], is_english)}"
-            result.append(branch_str)
-        return "\n".join(result)
-    
-    def create_multi_sheet_excel(self, df_split, file_path, area_name, all_employees_warning_counts):
-        is_english = self.is_english_processing_required(area_name)
-        sheet_names = self.generate_sheet_names(is_english)
-        analysis_sheets = self.generate_warning_analysis_sheets(df_split, all_employees_warning_counts, is_english)
-        
-        ordered_sheets = []
-        if sheet_names["branch_risk"] in analysis_sheets: ordered_sheets.append((sheet_names["branch_risk"], analysis_sheets[sheet_names["branch_risk"]]))
-        for sheet_key in ["3x_stern", "2x_stern"]:
-            if sheet_names[sheet_key] in analysis_sheets: ordered_sheets.append((sheet_names[sheet_key], analysis_sheets[sheet_names[sheet_key]]))
-        ordered_sheets.append((sheet_names["details"], df_split))
-        
-        with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-            for sheet_name, sheet_df in ordered_sheets:
-                sheet_df_copy = sheet_df.copy()
-                stat_cols_to_clear = [
-                    "严厉警告 Stern Reminder", "口述警告 Verbal Warning", "Stern Reminder", "Verbal Warning",
-                    self.FIELD_MAPPINGS['chinese']["满2次严厉警告员工人数"], self.FIELD_MAPPINGS['english']["满2次严厉警告员工人数"],
-                    self.FIELD_MAPPINGS['chinese']["超3次及以上严厉警告员工人数"], self.FIELD_MAPPINGS['english']["超3次及以上严厉警告员工人数"]
-                ]
-                if sheet_name != sheet_names["details"]:
-                    for col in stat_cols_to_clear:
-                        if col in sheet_df_copy.columns: sheet_df_copy[col] = sheet_df_copy[col].replace(0, None)
-                sheet_df_copy.to_excel(writer, sheet_name=sheet_name, index=False)
-        self.log(f"Multi-sheet Excel file generated: {os.path.basename(file_path)} ({'English Mode' if is_english else 'Chinese Mode'})")
-
-    def generate_email_content(self, area_name, df_split, all_employees_warning_counts):
-        is_english = self.is_english_processing_required(area_name)
-        
-        prefix = self.english_prefix_text.get("1.0", tk.END).strip() if is_english else self.chinese_prefix_text.get("1.0", tk.END).strip()
-        suffix = self.english_suffix_text.get("1.0", tk.END).strip() if is_english else self.chinese_suffix_text.get("1.0", tk.END).strip()
-        summary = self.generate_statistics_summary(df_split, all_employees_warning_counts, is_english)
-        
-        return f"{prefix}\n\n{summary}\n\n{suffix}".strip()
+            subject_prefix = self.subject_var.get()
+
+        return {
+            "source_file": self.source_file_var.get(), "split_column": self.split_column_var.get(),
+            "mapping_file": self.mapping_file_var.get(), "save_dir": self.save_dir_var.get(),
+            "smtp_server": self.smtp_server_var.get(), "smtp_port": self.smtp_port_var.get(),
+            "sender_email": self.sender_email_var.get(), "password": self.password_var.get(),
+            "max_messages_per_connection": self.max_messages_var.get(),
+            "sender_workers": self.sender_workers_var.get(), "messages_per_minute": self.messages_per_minute_var.get(),
+            "attachment_workers": self.attachment_workers_var.get(), "send_retries": self.send_retries_var.get(),
+            "archive_attachments": self.archive_attachments_var.get(), "dry_run": self.dry_run_var.get(),
+            "journal_dir": self.journal_dir_var.get().strip(), "fresh": self.fresh_var.get(),
+            "subject_prefix": subject_prefix, "cc_recipients": [cc.strip() for cc in self.cc_var.get().split(';') if cc.strip()]
+        }
 
-    def process_and_send_emails(self):
+    def process_and_send_emails(self, params, templates):
+        """Worker-thread body: run the batch and hand the outcome (or the fatal error) back to the Tk thread."""
         try:
-            self.log("Starting task, checking parameters...")
-            
-            subject_prefix = ""
-            if self.use_filename_as_subject_var.get():
-                source_file_path = self.source_file_var.get()
-                if not source_file_path: raise ValueError("Please select a source data file before using its name as the subject.")
-                subject_prefix = os.path.splitext(os.path.basename(source_file_path))[0]
-                self.log(f"Email subject prefix set to source filename: '{subject_prefix}'")
-            else:
-                subject_prefix = self.subject_var.get()
-
-            params = {
-                "source_file": self.source_file_var.get(), "split_column": self.split_column_var.get(),
-                "mapping_file": self.mapping_file_var.get(), "save_dir": self.save_dir_var.get(),
-                "smtp_server": self.smtp_server_var.get(), "smtp_port": self.smtp_port_var.get(),
-                "sender_email": self.sender_email_var.get(), "password": self.password_var.get(),
-                "subject_prefix": subject_prefix, "cc_recipients": [cc.strip() for cc in self.cc_var.get().split(';') if cc.strip()]
-            }
-            
-            for field in ["source_file", "split_column", "mapping_file", "save_dir", "smtp_server", "smtp_port", "sender_email", "password", "subject_prefix"]:
-                if not params[field]:
-                    if field == "subject_prefix": raise ValueError("Email subject prefix cannot be empty! Please fill it or check the 'use filename' option.")
-                    raise ValueError(f"Required field '{field}' is empty! Please check your configuration.")
-            
-            cn_prefix, cn_suffix = self.chinese_prefix_text.get("1.0", tk.END).strip(), self.chinese_suffix_text.get("1.0", tk.END).strip()
-            en_prefix, en_suffix = self.english_prefix_text.get("1.0", tk.END).strip(), self.english_suffix_text.get("1.0", tk.END).strip()
-            if not (cn_prefix or cn_suffix) and not (en_prefix or en_suffix):
-                raise ValueError("At least one email template (Chinese or English prefix/suffix) must be filled.")
-            
-            self.log("Parameter validation passed.")
-
-            self.log("Reading source data file...")
-            df_source = pd.read_csv(params["source_file"]) if params["source_file"].endswith('.csv') else pd.read_excel(params["source_file"])
-            self.log(f"Source data file contains {len(df_source)} rows.")
-            
-            self._get_column_mappings(df_source.columns)
-            df_source_preprocessed = self.preprocess_data(df_source)
-            
-            self.log("Performing global count of warnings for all employees...")
-            all_employees_warning_counts = self.count_warnings_per_employee(df_source_preprocessed)
-            self.log(f"Global count complete. Analyzed {len(all_employees_warning_counts)} unique employees.")
-            
-            self.log("Reading email mapping file...")
-            df_mapping = pd.read_excel(params["mapping_file"])
-            mapping_dict = pd.Series(df_mapping.iloc[:, 1].values, index=df_mapping.iloc[:, 0]).to_dict()
-            self.log("Email mapping loaded successfully.")
-
-            split_values = df_source_preprocessed[params["split_column"]].dropna().unique()
-            total_tasks = len(split_values)
-            self.progress['maximum'] = total_tasks
-            self.log(f"Detected {total_tasks} unique split values to process.")
-
-            for i, value in enumerate(split_values):
-                self.log("-" * 60)
-                self.log(f"Processing: [{value}] ({i+1}/{total_tasks})")
-
-                df_split = df_source_preprocessed[df_source_preprocessed[params["split_column"]] == value].copy()
-                self.log(f"Split data contains {len(df_split)} rows.")
-                
-                is_english_processing = self.is_english_processing_required(value)
-                processing_mode = "English Mode" if is_english_processing else "Chinese Mode"
-                self.log(f"Current processing mode: {processing_mode}")
-                
-                attachment_filename = f"{params['subject_prefix']}_{value}.xlsx"
-                attachment_path = os.path.join(params["save_dir"], attachment_filename)
-                
-                self.create_multi_sheet_excel(df_split, attachment_path, value, all_employees_warning_counts)
-
-                recipient_email = mapping_dict.get(value)
-                if not recipient_email:
-                    self.log(f"Warning: No email found for '{value}' in the mapping file. Skipping this item.")
-                    self.progress['value'] = i + 1
-                    continue
-                self.log(f"Found recipient: {recipient_email}")
-
-                email_body = self.generate_email_content(value, df_split, all_employees_warning_counts)
-                
-                msg = MIMEMultipart()
-                msg['From'], msg['To'], msg['Subject'] = params["sender_email"], recipient_email, f"{params['subject_prefix']}_{value}"
-                if params["cc_recipients"]: msg['Cc'] = ";".join(params["cc_recipients"])
-                msg.attach(MIMEText(email_body, 'plain', 'utf-8'))
-
-                try:
-                    with open(attachment_path, "rb") as f:
-                        part = MIMEApplication(f.read(), Name=attachment_filename)
-                    part['Content-Disposition'] = f'attachment; filename="{attachment_filename}"'
-                    msg.attach(part)
-                    self.log(f"Attached multi-sheet Excel file: {attachment_filename}")
-                except Exception as attach_error:
-                    self.log(f"Error attaching file: {attach_error}")
-                    continue
-
-                all_recipients = [recipient_email] + params["cc_recipients"]
-                self.log(f"Connecting to SMTP server: {params['smtp_server']}:{params['smtp_port']}...")
-                try:
-                    with smtplib.SMTP_SSL(params["smtp_server"], int(params["smtp_port"])) as server:
-                        server.login(params["sender_email"], params["password"])
-                        self.log("Server login successful, sending email...")
-                        server.sendmail(params["sender_email"], all_recipients, msg.as_string())
-                        cc_info = f"CC: {';'.join(params['cc_recipients'])}" if params["cc_recipients"] else "No CC"
-                        self.log(f"Email sent successfully to: {recipient_email} ({cc_info}) - Mode: {processing_mode}")
-                except Exception as email_error:
-                    self.log(f"Email sending failed: {email_error}")
-                    continue
-
-                self.progress['value'] = i + 1
-
-            self.log("-" * 60)
-            self.log("All tasks completed!")
-            messagebox.showinfo(self.LANG[self.current_lang]["all_tasks_complete_title"], self.LANG[self.current_lang]["all_tasks_complete_msg"])
-
+            outcomes = self.send_batch(params, templates)
         except Exception as e:
-            error_msg = self.LANG[self.current_lang]["execution_error_msg"].format(e)
             self.log(f"A fatal error occurred: {e}")
-            messagebox.showerror(self.LANG[self.current_lang]["execution_error_title"], error_msg)
-        finally:
-            self.start_button.config(state="normal")
+            self.send_results.put((None, e))
+        else:
+            self.send_results.put((outcomes, None))
+
+    def finish_sending(self, outcomes, error):
+        """Show the result of a send run; runs on the Tk thread."""
+        lang_dict = self.LANG[self.current_lang]
+        if error is not None:
+            messagebox.showerror(lang_dict["execution_error_title"], lang_dict["execution_error_msg"].format(error))
+        elif outcomes["failed"] or outcomes["skipped"]:
+            # 有失败或跳过的拆分值时用警告框，不能提示“全部成功”
+            messagebox.showwarning(lang_dict["tasks_incomplete_title"], lang_dict["tasks_incomplete_msg"].format(**outcomes))
+        else:
+            messagebox.showinfo(lang_dict["all_tasks_complete_title"], lang_dict["all_tasks_complete_msg"].format(**outcomes))
+        self.start_button.config(state="normal")
+
+    def run(self):
+        self.root.mainloop()
+
+
+def _configure_cli_logging(log_file=None, log_max_bytes=5 * 1024 * 1024, log_backup_count=5):
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
+    handlers = [console_handler]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=log_max_bytes, backupCount=log_backup_count, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+        handlers.append(file_handler)
+    LOGGER.handlers = handlers
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
+
+
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description="自动化邮件批量发送工具 (无界面模式) / Automated Bulk Email Sender (headless mode)",
+        epilog="退出码：0 所有拆分值均已发送；1 有拆分值发送失败或因映射文件中没有邮箱而跳过；2 参数错误或任务中断 / "
+               "Exit status: 0 every split value was sent; 1 some values failed or were skipped (no email in the mapping file); "
+               "2 invalid settings or the run was aborted"
+    )
+    parser.add_argument("--headless", action="store_true", help="命令行运行时必须指定；不带任何参数运行则打开图形界面 / Required on the command line; run without arguments to open the window")
+    parser.add_argument("-c", "--config", default=None, help="两列 (Key, Value) 配置文件，与界面“从文件加载配置”格式相同 / Two-column (Key, Value) config file, same format as the GUI's Load Config")
+    parser.add_argument("--source", default=None, help="原始数据文件 / Source data file")
+    parser.add_argument("--mapping", default=None, help="邮箱映射关系文件 / Email mapping file")
+    parser.add_argument("--save-dir", default=None, help="附件与失败报告保存目录 / Folder for attachments and failure reports")
+    parser.add_argument("--journal-dir", default=None, help="发送日志 (续传用) 所在目录，默认为用户数据目录 / Folder for the send journal used to resume runs (default: per-user data folder)")
+    parser.add_argument("--split-column", default=None, help="用于拆分的字段 / Field to split by")
+    parser.add_argument("--english-values", default=None, help="需要英文处理的拆分值，用英文分号';'隔开 / Split values to process in English, separated by ';'")
+    parser.add_argument("--subject", default=None, help="邮件主题前缀 / Email subject prefix")
+    parser.add_argument("--subject-from-filename", action="store_true", help="使用源文件名作为主题前缀 / Use the source filename as the subject prefix")
+    parser.add_argument("--cc", default=None, help="抄送人员，用英文分号';'隔开 / CC recipients separated by ';'")
+    parser.add_argument("--fresh", action="store_true", help="重新发送全部，忽略发送日志中已发送的记录 / Resend every split value, ignoring values the send journal marks as sent")
+    parser.add_argument("--dry-run", action="store_true", help="只生成 .eml 文件，不发送 / Write .eml files instead of sending")
+    parser.add_argument("--no-archive", action="store_true", help="不在保存目录中存档附件 / Do not save attachments to the save folder")
+    parser.add_argument("--log-file", default=None, help="滚动日志文件 / Rotating log file for the run")
+    args = parser.parse_args(argv)
+
+    # 优先级：默认值 < 配置文件 < 命令行参数；授权码也可通过环境变量传入，避免写进配置文件
+    settings = dict(EmailSenderPipeline.DEFAULT_SETTINGS)
+    if args.config:
+        settings.update({key: str(value) for key, value in EmailSenderPipeline.read_config_file(args.config).items()})
+    overrides = {
+        "source_file": args.source, "mapping_file": args.mapping, "save_dir": args.save_dir, "journal_dir": args.journal_dir, "split_column": args.split_column,
+        "english_values": args.english_values, "subject_prefix": args.subject, "cc_recipients": args.cc,
+        "password": os.environ.get("EMAIL_SENDER_PASSWORD") or None
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.dry_run: settings["dry_run"] = "1"
+    if args.fresh: settings["fresh"] = "1"
+    if args.no_archive: settings["archive_attachments"] = "0"
+    if args.subject_from_filename and settings["source_file"]:
+        settings["subject_prefix"] = os.path.splitext(os.path.basename(settings["source_file"]))[0]
+
+    _configure_cli_logging(args.log_file)
+    pipeline = EmailSenderPipeline({
+        'chinese': (settings["chinese_prefix"].strip(), settings["chinese_suffix"].strip()),
+        'english': (settings["english_prefix"].strip(), settings["english_suffix"].strip())
+    })
+    pipeline.english_processing_values = {value.strip() for value in settings["english_values"].split(';') if value.strip()}
+    params = {key: settings[key] for key in (
+        "source_file", "split_column", "mapping_file", "save_dir", "smtp_server", "smtp_port", "sender_email", "password",
+        "max_messages_per_connection", "sender_workers", "messages_per_minute", "attachment_workers", "send_retries", "journal_dir",
+        "subject_prefix"
+    )}
+    params["archive_attachments"] = EmailSenderPipeline.parse_bool(settings["archive_attachments"])
+    params["dry_run"] = EmailSenderPipeline.parse_bool(settings["dry_run"])
+    params["fresh"] = EmailSenderPipeline.parse_bool(settings["fresh"])
+    params["cc_recipients"] = [cc.strip() for cc in settings["cc_recipients"].split(';') if cc.strip()]
+
+    LOGGER.info("Starting task, checking parameters...")
+    if pipeline.english_processing_values:
+        LOGGER.info(f"English processing values: {', '.join(sorted(pipeline.english_processing_values))}")
+    try:
+        outcomes = pipeline.send_batch(params, pipeline.read_email_templates())
+    except Exception as e:
+        LOGGER.error(f"A fatal error occurred: {e}")
+        return 2
+    # 有发送失败或被跳过的拆分值时返回非零，便于定时任务报警
+    return 1 if outcomes["failed"] or outcomes["skipped"] else 0
+
 
 if __name__ == "__main__":
+    # 由显式的 --headless 参数选择无界面模式，而不是看有没有命令行参数
+    if "--headless" in sys.argv[1:]:
+        sys.exit(run_cli())
+    if len(sys.argv) > 1:
+        sys.exit("命令行运行需要 --headless 参数 / Command-line runs need --headless (see --headless --help)")
     app = EmailSenderApp()
-    app.mainloop()
\ No newline at end of file
+    app.run()
\ No newline at end of file